@@ -0,0 +1,321 @@
+import os
+import random
+import sys
+import time
+pwd = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, pwd + "/..")
+from DataSetBuilder import *
+from DataSetParser import *
+
+def printTime(description, start_time):
+    print("{}: {:.3f} seconds".format(description, time.time() - start_time))
+
+def buildNumericTsv(file_path, num_rows, num_cols):
+    random.seed(0)
+
+    with open(file_path, 'wb') as out_file:
+        out_file.write(("\t".join(["Sample"] + ["Gene{}".format(i) for i in range(1, num_cols)]) + "\n").encode())
+
+        for row_index in range(num_rows):
+            values = ["{:.3f}".format(random.gauss(0, 100)) for i in range(1, num_cols)]
+            out_file.write(("\t".join(["Sample{}".format(row_index)] + values) + "\n").encode())
+
+tmp_dir = sys.argv[1]
+
+#####################################################################
+# Formatting rows for a fixed-width file
+#####################################################################
+
+tsv_file_path = "{}/numeric.tsv".format(tmp_dir)
+buildNumericTsv(tsv_file_path, 1000, 2000)
+
+with open(tsv_file_path, 'rb') as tsv_file:
+    column_names = tsv_file.readline().rstrip(b"\n").split(b"\t")
+    data_start_pos = tsv_file.tell()
+    lines = tsv_file.readlines()
+
+column_sizes = summarize_columns_in_range(tsv_file_path, data_start_pos, os.path.getsize(tsv_file_path), column_names)[1]
+
+start_time = time.time()
+out_lines = []
+for line in lines:
+    line_items = line.rstrip(b"\n").split(b"\t")
+
+    line_out = b""
+    for i in range(len(column_sizes)):
+        line_out += format_string(line_items[i], column_sizes[i])
+
+    out_lines.append(line_out)
+expected = b"\n".join(out_lines) + b"\n"
+printTime("Format rows one cell at a time", start_time)
+
+start_time = time.time()
+result = format_fwf_rows(lines, column_sizes)
+printTime("Format rows in a block", start_time)
+
+if result != expected:
+    print("The block formatter produced different output!")
+    sys.exit(1)
+
+start_time = time.time()
+convert_tsv_to_fwf(tsv_file_path, "{}/numeric.fwf".format(tmp_dir))
+printTime("Convert 1000 x 2000 TSV to fixed-width file", start_time)
+
+#####################################################################
+# Mapping group and pathway names to column indices (wide data)
+#####################################################################
+
+def mapColumnNameDictToIndicesWithLists(the_dict, column_names):
+    # This is how map_column_name_dict_to_indices worked before it used a hash map.
+    map_dict = {}
+
+    for name, genes in the_dict.items():
+        overlapping_genes = set(column_names) & set(genes)
+
+        if len(overlapping_genes) > 0:
+            map_dict[name] = sorted([column_names.index(gene) for gene in overlapping_genes])
+
+    return map_dict
+
+def buildPathwayDict(column_names, num_pathways, genes_per_pathway):
+    random.seed(0)
+    return {"Pathway{}".format(i).encode(): random.sample(column_names[1:], genes_per_pathway) for i in range(num_pathways)}
+
+column_names = [b"Sample"] + ["Gene{}".format(i).encode() for i in range(1, 20000)]
+pathway_dict = buildPathwayDict(column_names, 200, 50)
+group_dict = {b"Group": column_names[1:]}
+
+start_time = time.time()
+expected = mapColumnNameDictToIndicesWithLists(pathway_dict, column_names)
+expected_groups = mapColumnNameDictToIndicesWithLists(group_dict, column_names)
+printTime("Map 200 pathways and 1 group to 20,000 columns using lists", start_time)
+
+start_time = time.time()
+result = map_column_name_dict_to_indices(pathway_dict, column_names)
+result_groups = map_column_name_dict_to_indices(group_dict, column_names)
+printTime("Map 200 pathways and 1 group to 20,000 columns using a hash map", start_time)
+
+if result != expected or result_groups != expected_groups:
+    print("The hash-map version produced different output!")
+    sys.exit(1)
+
+# The list-based version is too slow to run at this scale.
+column_names = [b"Sample"] + ["Gene{}".format(i).encode() for i in range(1, 200000)]
+pathway_dict = buildPathwayDict(column_names, 2000, 50)
+group_dict = {b"Group": column_names[1:]}
+
+start_time = time.time()
+map_column_name_dict_to_indices(pathway_dict, column_names)
+map_column_name_dict_to_indices(group_dict, column_names)
+printTime("Map 2000 pathways and 1 group to 200,000 columns using a hash map", start_time)
+
+# Merge two files with 100,000 columns each (and pathways)
+wide_fwf_file_paths = []
+for file_number in range(2):
+    wide_tsv_file_path = "{}/Wide{}.tsv".format(tmp_dir, file_number)
+    wide_fwf_file_path = "{}/Wide{}.fwf".format(tmp_dir, file_number)
+    wide_column_names = [b"Sample"] + column_names[(file_number * 100000 + 1):((file_number + 1) * 100000)]
+
+    with open(wide_tsv_file_path, 'wb') as out_file:
+        out_file.write(b"\t".join(wide_column_names) + b"\n")
+        for row_index in range(3):
+            out_file.write(b"\t".join([str(row_index).encode()] + [b"1.5"] * (len(wide_column_names) - 1)) + b"\n")
+
+    convert_tsv_to_fwf(wide_tsv_file_path, wide_fwf_file_path)
+    save_column_index_map_to_file(wide_fwf_file_path, ".pathways", map_column_name_dict_to_indices(pathway_dict, wide_column_names))
+
+    wide_fwf_file_paths.append(wide_fwf_file_path)
+
+start_time = time.time()
+merge_fwf_files(wide_fwf_file_paths, "{}/Wide.fwf".format(tmp_dir))
+printTime("Merge two files with 100,000 columns and 2000 pathways", start_time)
+
+#####################################################################
+# Numeric filters (tall data)
+#####################################################################
+
+tall_tsv_file_path = "{}/tall.tsv".format(tmp_dir)
+tall_fwf_file_path = "{}/tall.fwf".format(tmp_dir)
+buildNumericTsv(tall_tsv_file_path, 200000, 10)
+convert_tsv_to_fwf(tall_tsv_file_path, tall_fwf_file_path)
+tall_parser = DataSetParser(tall_fwf_file_path)
+numeric_filters = [NumericFilter(1, ">", 0), NumericFilter(2, "<=", 50)]
+
+os.rename(tall_fwf_file_path + ".nm", tall_fwf_file_path + ".nm.bak")
+start_time = time.time()
+expected = tall_parser.save_sample_indices_matching_filters([], numeric_filters)[0]
+printTime("Filter 200,000 rows with 2 numeric filters (parse the data file)", start_time)
+os.rename(tall_fwf_file_path + ".nm.bak", tall_fwf_file_path + ".nm")
+
+start_time = time.time()
+result = tall_parser.save_sample_indices_matching_filters([], numeric_filters)[0]
+printTime("Filter 200,000 rows with 2 numeric filters (numeric matrix)", start_time)
+
+if result != expected:
+    print("The numeric matrix produced different results!")
+    sys.exit(1)
+
+save_sorted_numeric_index(tall_fwf_file_path)
+tall_parser = DataSetParser(tall_fwf_file_path)
+start_time = time.time()
+result = tall_parser.save_sample_indices_matching_filters([], numeric_filters)[0]
+printTime("Filter 200,000 rows with 2 numeric filters (sorted index)", start_time)
+
+if result != expected:
+    print("The sorted index produced different results!")
+    sys.exit(1)
+
+selective_filters = [NumericFilter(1, ">", 250), NumericFilter(2, "<=", 50)]
+os.rename(tall_fwf_file_path + ".nsv", tall_fwf_file_path + ".nsv.bak")
+tall_parser = DataSetParser(tall_fwf_file_path)
+start_time = time.time()
+expected = tall_parser.save_sample_indices_matching_filters([], selective_filters)[0]
+printTime("Filter 200,000 rows with a selective numeric filter (numeric matrix)", start_time)
+os.rename(tall_fwf_file_path + ".nsv.bak", tall_fwf_file_path + ".nsv")
+
+tall_parser = DataSetParser(tall_fwf_file_path)
+start_time = time.time()
+result = tall_parser.save_sample_indices_matching_filters([], selective_filters)[0]
+printTime("Filter 200,000 rows with a selective numeric filter (sorted index)", start_time)
+
+if result != expected:
+    print("The sorted index produced different results!")
+    sys.exit(1)
+
+#####################################################################
+# Discrete filters (tall data)
+#####################################################################
+
+clinical_tsv_file_path = "{}/clinical.tsv".format(tmp_dir)
+clinical_fwf_file_path = "{}/clinical.fwf".format(tmp_dir)
+
+random.seed(0)
+with open(clinical_tsv_file_path, 'wb') as out_file:
+    out_file.write(b"Sample\tSex\tStage\tTreatment\n")
+
+    for row_index in range(500000):
+        out_file.write("Sample{}\t{}\t{}\t{}\n".format(row_index, random.choice(["F", "M", "NA"]), random.choice(["I", "II", "III", "IV"]), random.choice(["Drug{}".format(i) for i in range(300)])).encode())
+
+convert_tsv_to_fwf(clinical_tsv_file_path, clinical_fwf_file_path)
+clinical_parser = DataSetParser(clinical_fwf_file_path)
+discrete_filters = [DiscreteFilter(1, ["F"]), DiscreteFilter(2, ["III", "IV"]), DiscreteFilter(3, ["Drug1", "Drug2"])]
+
+os.rename(clinical_fwf_file_path + ".dcm", clinical_fwf_file_path + ".dcm.bak")
+start_time = time.time()
+expected = clinical_parser.save_sample_indices_matching_filters(discrete_filters, [])[0]
+printTime("Filter 500,000 rows with 3 discrete filters (compare the data file)", start_time)
+os.rename(clinical_fwf_file_path + ".dcm.bak", clinical_fwf_file_path + ".dcm")
+
+clinical_parser = DataSetParser(clinical_fwf_file_path)
+start_time = time.time()
+result = clinical_parser.save_sample_indices_matching_filters(discrete_filters, [])[0]
+printTime("Filter 500,000 rows with 3 discrete filters (discrete codes)", start_time)
+
+if result != expected:
+    print("The discrete codes produced different results!")
+    sys.exit(1)
+
+save_discrete_postings(clinical_fwf_file_path)
+clinical_parser = DataSetParser(clinical_fwf_file_path)
+start_time = time.time()
+result = clinical_parser.save_sample_indices_matching_filters(discrete_filters, [])[0]
+printTime("Filter 500,000 rows with 3 discrete filters (inverted index)", start_time)
+
+if result != expected:
+    print("The inverted index produced different results!")
+    sys.exit(1)
+
+#####################################################################
+# Numeric filters on clustered values (zone maps)
+#####################################################################
+
+clustered_tsv_file_path = "{}/clustered.tsv".format(tmp_dir)
+clustered_fwf_file_path = "{}/clustered.fwf".format(tmp_dir)
+
+random.seed(0)
+with open(clustered_tsv_file_path, 'wb') as out_file:
+    out_file.write(b"Sample\tAge\n")
+
+    for row_index in range(1000000):
+        out_file.write("Sample{:07d}\t{:.1f}\n".format(row_index, row_index / 10000 + random.random()).encode())
+
+convert_tsv_to_fwf(clustered_tsv_file_path, clustered_fwf_file_path)
+clustered_filters = [NumericFilter(1, ">", 95)]
+
+os.rename(clustered_fwf_file_path + ".nzm", clustered_fwf_file_path + ".nzm.bak")
+clustered_parser = DataSetParser(clustered_fwf_file_path)
+start_time = time.time()
+expected = clustered_parser.save_sample_indices_matching_filters([], clustered_filters)[0]
+printTime("Filter 1,000,000 clustered rows with a numeric filter (numeric matrix)", start_time)
+os.rename(clustered_fwf_file_path + ".nzm.bak", clustered_fwf_file_path + ".nzm")
+
+clustered_parser = DataSetParser(clustered_fwf_file_path)
+start_time = time.time()
+result = clustered_parser.save_sample_indices_matching_filters([], clustered_filters)[0]
+printTime("Filter 1,000,000 clustered rows with a numeric filter (zone maps)", start_time)
+
+if result != expected:
+    print("The zone maps produced different results!")
+    sys.exit(1)
+
+#####################################################################
+# Reading metadata for many variables
+#####################################################################
+
+start_time = time.time()
+for column_index in range(1, 201):
+    tall_parser.get_variable_meta(column_index % 10)
+printTime("Get metadata for 200 variables", start_time)
+
+start_time = time.time()
+with DataSetParser(tall_fwf_file_path) as open_parser:
+    for column_index in range(1, 201):
+        open_parser.get_variable_meta(column_index % 10)
+printTime("Get metadata for 200 variables (files kept open)", start_time)
+
+#####################################################################
+# Building output files in parallel
+#####################################################################
+
+tall_output_file_path = "{}/tall_output.tsv".format(tmp_dir)
+
+start_time = time.time()
+tall_parser.query([], [], [], [], [], tall_output_file_path)
+printTime("Build output for 200,000 rows", start_time)
+expected = readStringFromFile(tall_output_file_path)
+
+start_time = time.time()
+tall_parser.query([], [], [], [], [], tall_output_file_path, num_processes=4)
+printTime("Build output for 200,000 rows (4 processes)", start_time)
+result = readStringFromFile(tall_output_file_path)
+
+if result != expected:
+    print("The parallel output was different!")
+    sys.exit(1)
+
+#####################################################################
+# Extracting many contiguous columns
+#####################################################################
+
+wide_rows_tsv_file_path = "{}/wide_rows.tsv".format(tmp_dir)
+wide_rows_fwf_file_path = "{}/wide_rows.fwf".format(tmp_dir)
+buildNumericTsv(wide_rows_tsv_file_path, 5000, 2000)
+convert_tsv_to_fwf(wide_rows_tsv_file_path, wide_rows_fwf_file_path)
+
+with DataSetParser(wide_rows_fwf_file_path) as wide_rows_parser:
+    data_handle = wide_rows_parser.open_file()
+    ll = wide_rows_parser.read_int(".ll")
+    select_column_coords = wide_rows_parser.parse_column_coords(range(1, 1501), wide_rows_parser.open_file(".cc"), wide_rows_parser.read_int(".mccl"))
+
+    start_time = time.time()
+    expected = [b"\t".join([x.rstrip() for x in parse_data_values(row_index, ll, select_column_coords, data_handle)]) for row_index in range(5000)]
+    printTime("Extract 1500 contiguous columns for 5000 rows one cell at a time", start_time)
+
+    start_time = time.time()
+    extraction_plan = compile_extraction_plan(select_column_coords)
+    result = [b"\t".join(map(bytes.rstrip, parse_row_values(row_index, ll, extraction_plan, data_handle))) for row_index in range(5000)]
+    printTime("Extract 1500 contiguous columns for 5000 rows with an extraction plan", start_time)
+
+if result != expected:
+    print("The extraction plan produced different output!")
+    sys.exit(1)
@@ -0,0 +1,148 @@
+import fastnumbers
+from HyperLogLog import *
+
+# This class summarizes the values in a column as they are streamed in (in batches),
+#   so that the column type and description can be determined without storing
+#   every value. When every value seen so far is a number, only the min and max are
+#   kept (numeric columns often have a different value in each row, and there can be
+#   many thousands of them). If a non-number is seen after numbers were discarded, the
+#   type and description cannot be determined from the summary, and needs_reparse will be True.
+# If max_unique_values is specified, a column of non-numbers keeps its exact unique
+#   values only up to that many. Beyond that, it switches to a HyperLogLog sketch,
+#   and the type (ID vs. discrete) is determined from the estimated number of unique values.
+class ColumnSummary:
+    def __init__(self, name, max_unique_values=None):
+        self.name = name
+        self.max_unique_values = max_unique_values
+        self.num_values = 0
+        self.num_non_missing = 0
+        self.has_non_number = False
+        self.min_value = None
+        self.max_value = None
+        self.unique_values = set()
+        self.sketch = None
+        self.needs_reparse = False
+
+    # Input the values as a list of bytes objects.
+    def add_values(self, values):
+        self.num_values += len(values)
+
+        # We don't need to summarize the sample IDs
+        if self.name == b"Sample" or self.needs_reparse:
+            return
+
+        non_missing_values = [x for x in (y.rstrip() for y in values) if x != b"" and x != b"NA"]
+        self.num_non_missing += len(non_missing_values)
+        unique_values = set(non_missing_values)
+
+        if not self.has_non_number:
+            for x in unique_values:
+                if not fastnumbers.isfloat(x):
+                    self.has_non_number = True
+                    break
+
+            if not self.has_non_number and len(unique_values) > 0:
+                float_values = [float(x) for x in unique_values]
+                self.update_min_max(min(float_values), max(float_values))
+
+                # The numbers are not kept.
+                self.add_unique_values(None)
+                return
+
+        self.add_unique_values(unique_values)
+
+    # Combines this summary with a summary of other values from the same column.
+    def merge(self, other):
+        self.num_values += other.num_values
+        self.num_non_missing += other.num_non_missing
+        self.has_non_number = self.has_non_number or other.has_non_number
+        self.needs_reparse = self.needs_reparse or other.needs_reparse
+
+        if other.min_value != None:
+            self.update_min_max(other.min_value, other.max_value)
+
+        if other.sketch != None:
+            self.add_sketch(other.sketch)
+        else:
+            self.add_unique_values(other.unique_values)
+
+    def get_type(self):
+        if self.name == b"Sample":
+            return b"i"
+
+        if self.has_non_number:
+            if self.sketch != None:
+                # Allow for the error in the estimate
+                if self.sketch.estimate() >= self.num_non_missing * (1 - 3 * self.sketch.relative_error):
+                    return b"i" #ID
+                else:
+                    return b"d" #Discrete
+
+            if len(self.unique_values) == self.num_non_missing:
+                return b"i" #ID
+            else:
+                return b"d" #Discrete
+
+        return b"n" # Numeric
+
+    def get_description(self, column_type):
+        if column_type == b"i":
+            return "{}|ID".format(self.num_values).encode() # It doesn't make sense to store all the IDs in the description file.
+
+        if self.num_non_missing == 0:
+            return "1|NA".encode()
+
+        if column_type == b"n":
+            return "{:.8f},{:.8f}".format(self.min_value, self.max_value).encode()
+
+        # Discrete with too many unique values to list. Like an ID column,
+        #   the parser will look for options in the data.
+        if self.sketch != None:
+            return "{}|ID".format(self.sketch.estimate()).encode()
+
+        # Discrete
+        unique_values = sorted([x.decode() for x in self.unique_values])
+        return "{}|{}".format(len(unique_values), ",".join(unique_values)).encode()
+
+    ########################################################################
+    # Treat these as private functions.
+    ########################################################################
+
+    def update_min_max(self, min_value, max_value):
+        if self.min_value == None or min_value < self.min_value:
+            self.min_value = min_value
+        if self.max_value == None or max_value > self.max_value:
+            self.max_value = max_value
+
+    # Pass None to indicate that some unique values were discarded.
+    def add_unique_values(self, unique_values):
+        if unique_values == None:
+            self.unique_values = None
+            self.sketch = None
+        elif self.sketch != None:
+            self.sketch.add_values(unique_values)
+        elif self.unique_values != None:
+            self.unique_values.update(unique_values)
+
+            if self.max_unique_values != None and len(self.unique_values) > self.max_unique_values:
+                self.start_sketch()
+
+        self.check_needs_reparse()
+
+    def add_sketch(self, sketch):
+        if self.unique_values != None:
+            self.start_sketch()
+
+        if self.sketch != None:
+            self.sketch.merge(sketch)
+
+        self.check_needs_reparse()
+
+    def start_sketch(self):
+        self.sketch = HyperLogLog()
+        self.sketch.add_values(self.unique_values)
+        self.unique_values = None
+
+    def check_needs_reparse(self):
+        if self.has_non_number and self.unique_values == None and self.sketch == None:
+            self.needs_reparse = True
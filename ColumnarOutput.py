@@ -0,0 +1,99 @@
+import numpy as np
+import os
+import shutil
+import tempfile
+import zipfile
+
+# These functions save query output in binary formats. Each receives the column names
+#   (bytes), column types (b"n" for numeric, like .ct), the maximum width of each column,
+#   the number of rows, and the values as batches of rows. Each batch is a list with an
+#   array for each column: floats (NaN if missing) for numeric columns, bytes otherwise.
+#   Only one batch is held in memory at a time.
+COLUMNAR_OUTPUT_FILE_TYPES = ["arrow", "parquet", "npy", "npz"]
+
+def save_columnar_output(out_file_path, out_file_type, column_names, column_types, column_widths, num_rows, batches):
+    if out_file_type == "npy":
+        save_npy_output(out_file_path, column_names, column_types, column_widths, num_rows, batches)
+    elif out_file_type == "npz":
+        save_npz_output(out_file_path, column_names, column_types, column_widths, num_rows, batches)
+    elif out_file_type in ["arrow", "parquet"]:
+        save_arrow_output(out_file_path, out_file_type, column_names, column_types, batches)
+    else:
+        raise Exception("Invalid output file type: {}".format(out_file_type))
+
+# Saves a structured array with a field for each column.
+def save_npy_output(out_file_path, column_names, column_types, column_widths, num_rows, batches):
+    out_array = np.lib.format.open_memmap(out_file_path, mode="w+", dtype=get_numpy_dtype(column_names, column_types, column_widths), shape=(num_rows,))
+
+    start_row = 0
+    for batch in batches:
+        end_row = start_row + len(batch[0])
+
+        for name, values in zip(out_array.dtype.names, batch):
+            out_array[name][start_row:end_row] = values
+
+        start_row = end_row
+
+    out_array.flush()
+    del out_array
+
+# Saves an array for each column (named after the column), like numpy.savez.
+#   The arrays are filled in temporary files and then added to the archive.
+def save_npz_output(out_file_path, column_names, column_types, column_widths, num_rows, batches):
+    tmp_dir_path = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(out_file_path)))
+
+    try:
+        dtype = get_numpy_dtype(column_names, column_types, column_widths)
+        column_file_paths = ["{}/{}.npy".format(tmp_dir_path, i) for i in range(len(column_names))]
+        out_arrays = [np.lib.format.open_memmap(column_file_paths[i], mode="w+", dtype=dtype[i], shape=(num_rows,)) for i in range(len(column_names))]
+
+        start_row = 0
+        for batch in batches:
+            end_row = start_row + len(batch[0])
+
+            for out_array, values in zip(out_arrays, batch):
+                out_array[start_row:end_row] = values
+
+            start_row = end_row
+
+        for out_array in out_arrays:
+            out_array.flush()
+        del out_arrays
+
+        with zipfile.ZipFile(out_file_path, "w", allowZip64=True) as out_file:
+            for name, column_file_path in zip(dtype.names, column_file_paths):
+                out_file.write(column_file_path, name + ".npy")
+    finally:
+        shutil.rmtree(tmp_dir_path)
+
+# Saves an Arrow IPC file or a Parquet file. Missing numbers are saved as nulls.
+#   pyarrow is only needed for these formats, so it is imported here.
+def save_arrow_output(out_file_path, out_file_type, column_names, column_types, batches):
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise Exception("The pyarrow package is required to save {} files.".format(out_file_type))
+
+    schema = pyarrow.schema([(name.decode(), pyarrow.float64() if column_type == b"n" else pyarrow.string()) for name, column_type in zip(column_names, column_types)])
+
+    if out_file_type == "arrow":
+        writer = pyarrow.ipc.new_file(out_file_path, schema)
+    else:
+        writer = pyarrow.parquet.ParquetWriter(out_file_path, schema)
+
+    try:
+        for batch in batches:
+            arrays = []
+            for values, field in zip(batch, schema):
+                if field.type == pyarrow.float64():
+                    arrays.append(pyarrow.array(values, type=field.type, from_pandas=True))
+                else:
+                    arrays.append(pyarrow.array(np.char.decode(values, "utf-8"), type=field.type))
+
+            writer.write_batch(pyarrow.RecordBatch.from_arrays(arrays, schema=schema))
+    finally:
+        writer.close()
+
+def get_numpy_dtype(column_names, column_types, column_widths):
+    return np.dtype([(name.decode(), np.float64 if column_type == b"n" else "S{}".format(max(width, 1))) for name, column_type, width in zip(column_names, column_types, column_widths)])
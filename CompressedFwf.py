@@ -0,0 +1,132 @@
+from collections import OrderedDict
+import os
+import threading
+import zlib
+from DataSetHelper import *
+
+# Blocks hold as many rows as fit in this many bytes (at least one row), so
+#   reading a single value never decompresses much more than this.
+DEFAULT_BLOCK_BYTES = 1024 ** 2
+DEFAULT_MAX_CACHED_BYTES = 64 * 1024 ** 2
+
+# This class keeps decompressed blocks, dropping the least recently used ones once
+#   they take more than max_bytes (the newest block is always kept). It can be shared
+#   by several CompressedFwfFile objects and threads.
+class BlockCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_CACHED_BYTES):
+        self.max_bytes = max_bytes
+        self.num_bytes = 0
+        self.blocks = OrderedDict()
+        self.lock = threading.Lock()
+
+    # Returns None if the block is not in the cache.
+    def get(self, block_index):
+        with self.lock:
+            block = self.blocks.get(block_index)
+            if block != None:
+                self.blocks.move_to_end(block_index)
+
+            return block
+
+    def add(self, block_index, block):
+        with self.lock:
+            if block_index in self.blocks:
+                return
+
+            self.blocks[block_index] = block
+            self.num_bytes += len(block)
+
+            while self.num_bytes > self.max_bytes and len(self.blocks) > 1:
+                self.num_bytes -= len(self.blocks.popitem(last=False)[1])
+
+# This class reads a fixed-width file that was compressed with compress_fwf_file().
+#   The rows are stored in blocks that were compressed independently (with zlib),
+#   so reading a value only requires decompressing the block that contains it.
+#     .blocks - the compressed blocks, one after another
+#     .bo - the position where each block starts in .blocks (fixed width, like .cc)
+#     .brow - the number of rows in each block (the last block may have fewer)
+#   It can be sliced like the memory-mapped handle of an uncompressed file, so it
+#   works with parse_data_values(). Decompressed blocks are kept in block_cache (a
+#   BlockCache), which is passed in so it can outlive a single handle.
+class CompressedFwfFile:
+    def __init__(self, fwf_file_path, block_cache=None):
+        self.blocks_handle = openReadFile(fwf_file_path, ".blocks")
+        self.bo_handle = openReadFile(fwf_file_path, ".bo")
+        self.mbol = readIntFromFile(fwf_file_path, ".mbol")
+        self.num_blocks = len(self.bo_handle) // (self.mbol + 1) - 1
+        self.block_length = readIntFromFile(fwf_file_path, ".brow") * readIntFromFile(fwf_file_path, ".ll")
+
+        self.block_cache = BlockCache() if block_cache == None else block_cache
+
+    # Only slices with a start and stop position (no step) are supported.
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.start == None or key.stop == None or key.step != None:
+            raise Exception("Invalid index for a compressed file: {}".format(key))
+
+        start = key.start
+        stop = key.stop
+        block_index = start // self.block_length
+        block_start = block_index * self.block_length
+
+        # Each row is in a single block, so this is the usual case.
+        if stop <= block_start + self.block_length:
+            return self.get_block(block_index)[(start - block_start):(stop - block_start)]
+
+        pieces = []
+        while block_start < stop and block_index < self.num_blocks:
+            pieces.append(self.get_block(block_index)[max(start - block_start, 0):(stop - block_start)])
+            block_index += 1
+            block_start += self.block_length
+
+        return b"".join(pieces)
+
+    def close(self):
+        self.blocks_handle.close()
+        self.bo_handle.close()
+
+    ########################################################################
+    # Treat these as private functions.
+    ########################################################################
+
+    def get_block(self, block_index):
+        block = self.block_cache.get(block_index)
+        if block != None:
+            return block
+
+        if block_index >= self.num_blocks:
+            return b""
+
+        coords = next(parse_data_coords([block_index], self.bo_handle, self.mbol))
+        block = zlib.decompress(self.blocks_handle[coords[1]:coords[2]])
+        self.block_cache.add(block_index, block)
+
+        return block
+
+# Compresses a fixed-width file into blocks of rows (see CompressedFwfFile). The other
+#   files (.cc, .cn, etc.) are not changed. If remove_uncompressed is True, the
+#   uncompressed file is deleted, and DataSetParser then reads the compressed file.
+# Each block has as many rows as fit in block_bytes, unless rows_per_block is specified.
+def compress_fwf_file(fwf_file_path, block_bytes=DEFAULT_BLOCK_BYTES, compression_level=6, remove_uncompressed=False, rows_per_block=None):
+    ll = readIntFromFile(fwf_file_path, ".ll")
+    if rows_per_block == None:
+        rows_per_block = max(1, block_bytes // ll)
+
+    block_length = rows_per_block * ll
+    block_coords = [b"0"]
+    cumulative_position = 0
+
+    with open(fwf_file_path, 'rb') as in_file:
+        with open(fwf_file_path + ".blocks", 'wb') as out_file:
+            for block in iter(lambda: in_file.read(block_length), b""):
+                compressed_block = zlib.compress(block, compression_level)
+                out_file.write(compressed_block)
+
+                cumulative_position += len(compressed_block)
+                block_coords.append(str(cumulative_position).encode())
+
+    # The last position is the longest
+    writeFixedWidthFile(fwf_file_path, ".bo", ".mbol", block_coords, len(block_coords[-1]))
+    writeStringToFile(fwf_file_path, ".brow", str(rows_per_block).encode())
+
+    if remove_uncompressed:
+        os.remove(fwf_file_path)
@@ -1,6 +1,14 @@
 import os
 
 MAX_NUM_PROCESSES = int(os.environ["MAX_NUM_PROCESSES"])
+# Number of processes used to build the fixed-width files for a single dataset
+NUM_BUILD_PROCESSES = int(os.environ.get("NUM_BUILD_PROCESSES", "1"))
+# Beyond this many unique values, the number of unique values in a column is estimated
+MAX_UNIQUE_VALUES = int(os.environ.get("MAX_UNIQUE_VALUES", "100000"))
+# Set this to 1 to store the data files in compressed blocks (see CompressedFwf.py)
+COMPRESS_DATA_FILES = os.environ.get("COMPRESS_DATA_FILES", "0") == "1"
+# Set this to 1 to build a sorted index of each numeric column, for faster numeric filters
+BUILD_SORTED_INDEX = os.environ.get("BUILD_SORTED_INDEX", "0") == "1"
 REPO_OWNER = 'srp33'
 REPO_URL = 'https://api.github.com/repos/{}/WishBuilder/'.format(REPO_OWNER)
 WB_DIRECTORY = "/Shared"
@@ -1,94 +1,97 @@
-import gzip
 import fastnumbers
+import heapq
 import mmap
+from multiprocessing import Pool
+import numpy as np
 import os
 import shutil
 import sys
 import time
+import zlib
+from ColumnSummary import *
 from DataSetHelper import *
-
-def convert_tsv_to_fwf(tsv_file_path, fwf_file_path):
-    column_size_dict = {}
-    column_start_coords = []
-
-    # Initialize a dictionary with the column index as key and width of the column as value
+from PathwayIndex import *
+
+# Files that help DataSetParser answer queries quickly (see save_query_files).
+QUERY_FILE_EXTENSIONS = [".nm", ".nmc", ".nzm", ".nzb", ".dcm", ".dcc", ".nh", ".dh", ".dho"]
+
+# Optional files that only some datasets have (see build_geney_files). They are removed
+#   when a dataset is built again at the same path, so DataSetParser does not use the
+#   ones from an older build.
+OPTIONAL_FILE_EXTENSIONS = QUERY_FILE_EXTENSIONS + [".dp", ".dpo", ".nsv", ".nsr", ".blocks", ".bo", ".mbol", ".brow"]
+
+def remove_optional_files(fwf_file_path):
+    for file_extension in OPTIONAL_FILE_EXTENSIONS:
+        if os.path.exists(fwf_file_path + file_extension):
+            os.remove(fwf_file_path + file_extension)
+
+# If max_unique_values is specified, the number of unique values in ID and discrete
+#   columns is estimated (with bounded memory) once it exceeds that number. If
+#   build_query_files is False, save_query_files is not called (for example, when
+#   the file will be merged with others and the query files are built afterward).
+def convert_tsv_to_fwf(tsv_file_path, fwf_file_path, num_processes=1, max_unique_values=None, build_query_files=True):
+    # Read the column names and find where the data lines start
     with open(tsv_file_path, 'rb') as my_file:
         column_names = my_file.readline().rstrip(b"\n").split(b"\t")
+        data_start_pos = my_file.tell()
 
-        for i in range(len(column_names)):
-            column_size_dict[i] = 0
+    remove_optional_files(fwf_file_path)
 
-    # Iterate through the lines to find the max width of each column
-    with open(tsv_file_path, 'rb') as my_file:
-        # Ignore the header line because we saved column names elsewhere
-        my_file.readline()
+    # Split the data lines into byte ranges that can be processed independently
+    line_ranges = find_line_ranges(tsv_file_path, data_start_pos, num_processes)
 
-        num_rows = 0
-        for line in my_file:
-            num_rows += 1
-            line_items = line.rstrip(b"\n").split(b"\t")
+    # Iterate through the lines in each range to find the number of rows, the max width
+    #   of each column, and a summary of each column's values (used to find column types).
+    #   The summaries of each range are merged as they arrive.
+    summarize_args = [(tsv_file_path, start_pos, end_pos, column_names, max_unique_values) for start_pos, end_pos in line_ranges]
+
+    range_num_rows_list = []
+    column_sizes = [0 for i in range(len(column_names))]
+    column_summaries = [ColumnSummary(x, max_unique_values) for x in column_names]
+    for range_num_rows, range_column_sizes, range_column_summaries in imap_in_processes(summarize_columns_in_range, summarize_args, num_processes):
+        range_num_rows_list.append(range_num_rows)
 
-            for i in range(len(line_items)):
-                column_size_dict[i] = max([column_size_dict[i], len(line_items[i])])
+        for i in range(len(column_sizes)):
+            column_sizes[i] = max([column_sizes[i], range_column_sizes[i]])
+            column_summaries[i].merge(range_column_summaries[i])
+
+    num_rows = sum(range_num_rows_list)
 
     # Calculate the length of the first line (and thus all the other lines)
-    line_length = sum([column_size_dict[i] for i in range(len(column_names))])
+    line_length = sum(column_sizes)
 
     # Save value that indicates line length
     writeStringToFile(fwf_file_path, ".ll", str(line_length + 1).encode())
 
-    # Calculate the positions where each column starts
-    cumulative_position = 0
-    for i in range(len(column_names)):
-        column_size = column_size_dict[i]
-        column_start_coords.append(str(cumulative_position).encode())
-        cumulative_position += column_size
-    column_start_coords.append(str(cumulative_position).encode())
-
     # Build a map of the column names and save this to a file
-    column_names_string, max_col_name_length = buildStringMap([x for x in column_names])
-    writeStringToFile(fwf_file_path, ".cn", column_names_string)
-    writeStringToFile(fwf_file_path, ".mcnl", max_col_name_length)
-
-    # Calculate the column coordinates and max length of these coordinates
-    column_coords_string, max_column_coord_length = buildStringMap(column_start_coords)
-
-    # Save column coordinates
-    writeStringToFile(fwf_file_path, ".cc", column_coords_string)
+    writeFixedWidthFile(fwf_file_path, ".cn", ".mcnl", column_names, getMaxStringLength(column_names))
 
-    # Save value that indicates maximum length of column coords string
-    writeStringToFile(fwf_file_path, ".mccl", max_column_coord_length)
+    # Save the positions where each column starts (the last position is the longest)
+    writeFixedWidthFile(fwf_file_path, ".cc", ".mccl", iterate_column_coords(column_sizes), len(str(line_length)))
 
     # Save number of rows and cols
     writeStringToFile(fwf_file_path, ".nrow", str(num_rows).encode())
     writeStringToFile(fwf_file_path, ".ncol", str(len(column_names)).encode())
 
-    # Save the data to output file
-    with open(tsv_file_path, 'rb') as my_file:
-        # Ignore the header line because we saved column names elsewhere
-        my_file.readline()
-
-        with open(fwf_file_path, 'wb') as out_file:
-            out_lines = []
-            chunk_size = 1000
-
-            for line in my_file:
-                line_items = line.rstrip(b"\n").split(b"\t")
-
-                line_out = b""
-                for i in sorted(column_size_dict.keys()):
-                    line_out += format_string(line_items[i], column_size_dict[i])
+    # Every output line has the same length, so we know where each range's rows will start.
+    #   Create the output file at its full size so each range can be written in place.
+    with open(fwf_file_path, 'wb') as out_file:
+        out_file.truncate(num_rows * (line_length + 1))
 
-                out_lines.append(line_out)
+    write_args = []
+    out_start_pos = 0
+    for (start_pos, end_pos), range_num_rows in zip(line_ranges, range_num_rows_list):
+        write_args.append((tsv_file_path, fwf_file_path, start_pos, end_pos, column_sizes, out_start_pos))
+        out_start_pos += range_num_rows * (line_length + 1)
 
-                if len(out_lines) % chunk_size == 0:
-                    out_file.write(b"\n".join(out_lines) + b"\n")
-                    out_lines = []
+    # Save the data to output file
+    map_in_processes(write_fwf_rows_in_range, write_args, num_processes)
 
-            if len(out_lines) > 0:
-                out_file.write(b"\n".join(out_lines) + b"\n")
+    save_column_types(fwf_file_path, column_names, column_summaries)
+    save_sorted_sample_order(fwf_file_path)
 
-    parse_and_save_column_types(fwf_file_path)
+    if build_query_files:
+        save_query_files(fwf_file_path, num_processes)
 
     # Save group names and indices to file
     in_file_extension = os.path.splitext(tsv_file_path)[1]
@@ -103,202 +106,284 @@ def convert_tsv_to_fwf(tsv_file_path, fwf_file_path):
     if len(pathway_gene_indices_dict) > 0:
         save_column_index_map_to_file(fwf_file_path, ".pathways", pathway_gene_indices_dict)
 
-def parse_and_save_column_types(file_path):
-    # Initialize
-    data_handle = openReadFile(file_path)
-    ll = readIntFromFile(file_path, ".ll")
-    cc_handle = openReadFile(file_path, ".cc")
-    mccl = readIntFromFile(file_path, ".mccl")
-    cn_handle = openReadFile(file_path, ".cn")
-    mcnl = readIntFromFile(file_path, ".mcnl")
-    num_rows = readIntFromFile(file_path, ".nrow")
-    num_cols = readIntFromFile(file_path, ".ncol")
-    col_coords = list(parse_data_coords(range(num_cols), cc_handle, mccl))
-
-    # Find column type and description for each column
-    column_types = []
-    column_descriptions = []
-    for col_index in range(num_cols):
-        column_name = parse_meta_value(cn_handle, mcnl, col_index)
-        column_values = [x.rstrip() for x in parse_column_values(data_handle, num_rows, col_coords, ll, 0, col_index)]
-        column_type = parse_column_type(column_name, column_values)
-
-        if col_index > 0 and col_index % 100 == 0:
-            print("Finding column type and description - {}".format(col_index))
+# Yields the position where each column starts (followed by the position where the last column ends)
+def iterate_column_coords(column_sizes):
+    cumulative_position = 0
 
-        column_types.append(column_type)
-        column_descriptions.append(get_column_description(column_type, column_values))
+    for column_size in column_sizes:
+        yield str(cumulative_position).encode()
+        cumulative_position += column_size
 
-    # Save the column types and max length of these types
-    column_types_string, max_column_types_length = buildStringMap(column_types)
-    writeStringToFile(file_path, ".ct", column_types_string)
-    writeStringToFile(file_path, ".mctl", max_column_types_length)
+    yield str(cumulative_position).encode()
+
+# Splits the lines of a file (starting at start_pos) into byte ranges that begin
+#   and end on line boundaries. When running in parallel, we use several ranges
+#   per process so that the work is balanced when some lines are longer than others.
+def find_line_ranges(file_path, start_pos, num_processes):
+    file_size = os.path.getsize(file_path)
+    num_ranges = 1 if num_processes <= 1 else num_processes * 4
+    range_size = max([1, (file_size - start_pos) // num_ranges])
+
+    boundaries = [start_pos]
+    with open(file_path, 'rb') as my_file:
+        for i in range(1, num_ranges):
+            approx_pos = start_pos + i * range_size
+            if approx_pos <= boundaries[-1]:
+                continue
 
-    # Save column type descriptions and max length of these
-    column_desc_string, max_column_desc_length = buildStringMap(column_descriptions)
-    writeStringToFile(file_path, ".cd", column_desc_string)
-    writeStringToFile(file_path, ".mcdl", max_column_desc_length)
+            # Move to the start of the next line
+            my_file.seek(approx_pos - 1)
+            my_file.readline()
+            pos = my_file.tell()
 
-    data_handle.close()
-    cc_handle.close()
-    cn_handle.close()
+            if pos > boundaries[-1] and pos < file_size:
+                boundaries.append(pos)
+    boundaries.append(file_size)
 
-def parse_column_type(name, values):
-    if name == b"Sample":
-        return b"i"
+    return [(boundaries[i], boundaries[i + 1]) for i in range(len(boundaries) - 1)]
 
-    non_missing_values = [x for x in values if x != b"" and x != b"NA"]
-    unique_values = set(non_missing_values)
+def iterate_lines_in_range(my_file, start_pos, end_pos):
+    my_file.seek(start_pos)
+    pos = start_pos
 
-    has_non_number = False
-    for x in unique_values:
-        if not fastnumbers.isfloat(x):
-            has_non_number = True
+    while pos < end_pos:
+        line = my_file.readline()
+        if line == b"":
             break
 
-    if has_non_number:
-        if len(unique_values) == len(non_missing_values):
-            return b"i" #ID
-        else:
-            return b"d" #Discrete
+        pos += len(line)
+        yield line
 
-    return b"n" # Numeric
+def summarize_columns_in_range(tsv_file_path, start_pos, end_pos, column_names, max_unique_values=None):
+    column_sizes = [0 for i in range(len(column_names))]
+    column_summaries = [ColumnSummary(x, max_unique_values) for x in column_names]
+    num_rows = 0
 
-def get_column_description(column_type, column_values):
-    if column_type == b"i":
-        return "{}|ID".format(len(column_values)).encode() # It doesn't make sense to store all the IDs in the description file.
+    with open(tsv_file_path, 'rb') as my_file:
+        rows = []
+        chunk_size = 1000
+        # Wide rows are summarized in smaller chunks so the split values don't take too much memory.
+        max_chunk_bytes = 16 * 1024 ** 2
+        chunk_bytes = 0
 
-    non_missing_values = [x for x in column_values if x != b"" and x != b"NA"]
+        for line in iterate_lines_in_range(my_file, start_pos, end_pos):
+            num_rows += 1
+            line_items = line.rstrip(b"\n").split(b"\t")
 
-    if len(non_missing_values) == 0:
-        return "1|NA".encode()
+            if len(line_items) != len(column_names):
+                raise Exception("Expected {} values but found {} in this line: {}".format(len(column_names), len(line_items), line.decode()))
 
-    if column_type == b"n":
-        float_values = [float(x) for x in non_missing_values]
-        return "{:.8f},{:.8f}".format(min(float_values), max(float_values)).encode()
+            rows.append(line_items)
+            chunk_bytes += len(line)
 
-    # Discrete
-    unique_values = sorted([x.decode() for x in set(non_missing_values)])
-    return "{}|{}".format(len(unique_values), ",".join(unique_values)).encode()
+            if len(rows) == chunk_size or chunk_bytes >= max_chunk_bytes:
+                summarize_rows(rows, column_sizes, column_summaries)
+                rows = []
+                chunk_bytes = 0
 
-def format_string(x, size):
-    formatted = "{:<" + str(size) + "}"
-    return formatted.format(x.decode()).encode()
+        if len(rows) > 0:
+            summarize_rows(rows, column_sizes, column_summaries)
 
-def getMaxStringLength(the_list):
-    return max([len(x) for x in set(the_list)])
+    return num_rows, column_sizes, column_summaries
 
-def buildStringMap(the_list):
-    # Find maximum length of value
-    max_value_length = getMaxStringLength(the_list)
+def summarize_rows(rows, column_sizes, column_summaries):
+    for i, column_values in enumerate(zip(*rows)):
+        column_sizes[i] = max([column_sizes[i], max([len(x) for x in column_values])])
+        column_summaries[i].add_values(column_values)
 
-    # Build output string
-    output = ""
-    formatter = "{:<" + str(max_value_length) + "}\n"
-    for value in the_list:
-        output += formatter.format(value.decode())
+def write_fwf_rows_in_range(tsv_file_path, fwf_file_path, start_pos, end_pos, column_sizes, out_start_pos):
+    with open(tsv_file_path, 'rb') as my_file:
+        with open(fwf_file_path, 'r+b') as out_file:
+            out_file.seek(out_start_pos)
 
-    return output.encode(), str(max_value_length).encode()
+            lines = []
+            chunk_size = 1000
 
-def parse_column_values(data_handle, data_num_rows, cc, ll, row_start_index, col_index):
-    col_coords = [cc[col_index]]
-    for row_index in range(row_start_index, data_num_rows):
-        yield next(parse_data_values(row_index, ll, col_coords, data_handle))
+            for line in iterate_lines_in_range(my_file, start_pos, end_pos):
+                lines.append(line)
 
-def parse_row(meta, row_index, col_coords):
-    return b"".join(parse_data_values(row_index, meta["ll"], col_coords, meta["data_handle"]))
+                if len(lines) == chunk_size:
+                    out_file.write(format_fwf_rows(lines, column_sizes))
+                    lines = []
 
-def parse_row_for_sample(meta, sample_id, col_coords):
-    if sample_id in meta["sample_lookup"]:
-        return parse_row(meta, meta["sample_lookup"][sample_id], col_coords)
-    else:
-        # Fill in missing data points with spaces
-        return b"".join([b" " * (coords[2] - coords[1]) for coords in col_coords])
+            if len(lines) > 0:
+                out_file.write(format_fwf_rows(lines, column_sizes))
 
-def build_gene_pathways_dict():
-    in_gmt_file_url = "https://www.pathwaycommons.org/archives/PC2/v11/PathwayCommons11.All.hgnc.gmt.gz"
-    in_gmt_file_path = "/tmp/{}".format(os.path.basename(in_gmt_file_url))
-    if not os.path.exists(in_gmt_file_path):
-        os.system("wget -O {} {}".format(in_gmt_file_path, in_gmt_file_url))
+# Pads a block of TSV lines to the specified column widths and returns them as a
+#   single bytes object (with a newline after each row). The padding is done with
+#   bytes.ljust via map(), so there is no Python-level work per cell.
+def format_fwf_rows(lines, column_sizes):
+    num_cols = len(column_sizes)
+    out_lines = []
 
-    gene_pathways_dict = {}
-    pathways = set()
+    for line in lines:
+        line_items = line.rstrip(b"\n").split(b"\t")
 
-    with gzip.open(in_gmt_file_path, 'rb') as in_gmt_file:
-        for line in in_gmt_file:
-            line_items = line.rstrip(b"\n").split(b"\t")
+        if len(line_items) < num_cols:
+            raise Exception("Expected {} values but found {} in this line: {}".format(num_cols, len(line_items), line.decode()))
 
-            data_source = line_items[1].split(b";")[1].replace(b"datasource: ", b"").strip()
-            pathway_name = line_items[1].split(b";")[0].replace(b"name: ", b"").strip() + b" [" + data_source + b"]"
-            genes = line_items[2:]
+        out_lines.append(b"".join(map(bytes.ljust, line_items, column_sizes)))
 
-            # I don't think it makes sense to call something a pathway if there is only one gene
-            if len(genes) < 2:
-                continue
+    out_lines.append(b"")
+
+    return b"\n".join(out_lines)
+
+# Like map_in_processes, but the arguments can come from a generator, and the results
+#   are discarded. Only a few calls per process are queued at a time, so the arguments
+#   are not all held in memory at once.
+def apply_in_processes(function, args_iter, num_processes):
+    if num_processes <= 1:
+        for args in args_iter:
+            function(*args)
+        return
+
+    with Pool(num_processes) as pool:
+        pending_results = []
+
+        for args in args_iter:
+            pending_results.append(pool.apply_async(function, args))
+
+            if len(pending_results) >= num_processes * 2:
+                pending_results.pop(0).get()
+
+        for result in pending_results:
+            result.get()
 
-            for gene in genes:
-                if gene not in gene_pathways_dict:
-                    gene_pathways_dict[gene] = set()
-                gene_pathways_dict[gene].add(pathway_name)
+# Calls the function once for each tuple of arguments. When more than one process
+#   is requested, the calls are distributed across a pool of processes.
+#   The results are returned in the same order as the arguments.
+def map_in_processes(function, args_list, num_processes):
+    if num_processes <= 1 or len(args_list) <= 1:
+        return [function(*args) for args in args_list]
 
-                pathways.add(pathway_name)
+    with Pool(min([num_processes, len(args_list)])) as pool:
+        return pool.starmap(function, args_list)
 
-    return gene_pathways_dict, pathways
+# Like map_in_processes, but the results are generated (in order) as they become
+#   available, so the caller can combine them without holding them all in memory.
+def imap_in_processes(function, args_list, num_processes):
+    if num_processes <= 1 or len(args_list) <= 1:
+        for args in args_list:
+            yield function(*args)
+        return
+
+    with Pool(min([num_processes, len(args_list)])) as pool:
+        yield from pool.imap(call_with_args, [(function, args) for args in args_list])
+
+def call_with_args(function_and_args):
+    function, args = function_and_args
+    return function(*args)
+
+def save_column_types(fwf_file_path, column_names, column_summaries, max_block_bytes=16777216):
+    column_types = []
+    column_descriptions = []
+    reparse_col_indices = []
+
+    for col_index, column_summary in enumerate(column_summaries):
+        if column_summary.needs_reparse:
+            column_types.append(None)
+            column_descriptions.append(None)
+            reparse_col_indices.append(col_index)
+        else:
+            column_type = column_summary.get_type()
+            column_types.append(column_type)
+            column_descriptions.append(column_summary.get_description(column_type))
+
+    # The summaries of a few columns (numbers at first but then non-numbers) may not have
+    #   kept enough values. We go back to the data file for these columns only, and
+    #   summarize them again a block of rows at a time. We already know they contain
+    #   non-numbers, so the new summaries keep their unique values from the start.
+    if len(reparse_col_indices) > 0:
+        ll = readIntFromFile(fwf_file_path, ".ll")
+        cc_handle = openReadFile(fwf_file_path, ".cc")
+        mccl = readIntFromFile(fwf_file_path, ".mccl")
+        num_rows = readIntFromFile(fwf_file_path, ".nrow")
+        col_coords = list(parse_data_coords(reparse_col_indices, cc_handle, mccl))
+        cc_handle.close()
+
+        reparse_summaries = []
+        for col_index in reparse_col_indices:
+            reparse_summaries.append(ColumnSummary(column_names[col_index], column_summaries[col_index].max_unique_values))
+            reparse_summaries[-1].has_non_number = True
+
+        rows_per_block = max([1, max_block_bytes // ll])
+        with open(fwf_file_path, 'rb') as data_file:
+            for start_row in range(0, num_rows, rows_per_block):
+                block = data_file.read(min([rows_per_block, num_rows - start_row]) * ll)
+                line_starts = range(0, len(block), ll)
+
+                for column_summary, coords in zip(reparse_summaries, col_coords):
+                    column_summary.add_values([block[x + coords[1]:x + coords[2]] for x in line_starts])
+
+        for col_index, column_summary in zip(reparse_col_indices, reparse_summaries):
+            column_types[col_index] = column_summary.get_type()
+            column_descriptions[col_index] = column_summary.get_description(column_types[col_index])
+
+    # Save the column types and max length of these types
+    writeFixedWidthFile(fwf_file_path, ".ct", ".mctl", column_types, getMaxStringLength(column_types))
+
+    # Save column type descriptions and max length of these
+    writeFixedWidthFile(fwf_file_path, ".cd", ".mcdl", column_descriptions, getMaxStringLength(column_descriptions))
+
+def format_string(x, size):
+    formatted = "{:<" + str(size) + "}"
+    return formatted.format(x.decode()).encode()
+
+def parse_column_values(data_handle, data_num_rows, cc, ll, row_start_index, col_index):
+    col_coords = [cc[col_index]]
+    for row_index in range(row_start_index, data_num_rows):
+        yield next(parse_data_values(row_index, ll, col_coords, data_handle))
 
 def parse_column_names(fwf_file_path):
     with open(fwf_file_path + ".cn", "rb") as cn_file:
         return [x.rstrip() for x in cn_file]
 
-def map_pathway_dict_to_column_indices(column_names, alias_dict):
-    gene_pathways_dict, pathways = build_gene_pathways_dict()
-    pathway_gene_indices_dict = {pathway:set() for pathway in pathways}
+def map_pathway_dict_to_column_indices(column_names, alias_dict, gmt_file_path=DEFAULT_GMT_FILE_PATH):
+    pathway_index = get_pathway_index(gmt_file_path)
+    pathway_gene_indices_dict = {}
 
     for i, column_name in enumerate(column_names):
-        alias = alias_dict.get(column_name, "")
+        pathways = pathway_index.get_pathways(column_name)
 
-        if column_name in gene_pathways_dict:
-            for pathway in gene_pathways_dict[column_name]:
-                pathway_gene_indices_dict[pathway].add(i)
-        elif alias in gene_pathways_dict:
-            for pathway in gene_pathways_dict[alias]:
-                pathway_gene_indices_dict[pathway].add(i)
+        if len(pathways) == 0 and column_name in alias_dict:
+            pathways = pathway_index.get_pathways(alias_dict[column_name])
 
-    pathway_gene_indices_dict2 = {}
-    for pathway, gene_indices in pathway_gene_indices_dict.items():
-        if len(gene_indices) > 0:
-            pathway_gene_indices_dict2[pathway] = sorted(list(pathway_gene_indices_dict[pathway]))
+        for pathway in pathways:
+            pathway_gene_indices_dict.setdefault(pathway, []).append(i)
 
-    return pathway_gene_indices_dict2
+    return pathway_gene_indices_dict
 
 def map_column_name_dict_to_indices(the_dict, column_names):
+    # Map each column name to the index where it first occurs
+    column_index_dict = {}
+    for i, column_name in enumerate(column_names):
+        if column_name not in column_index_dict:
+            column_index_dict[column_name] = i
+
     map_dict = {}
 
     for name, genes in the_dict.items():
-        overlapping_genes = set(column_names) & set(genes)
+        overlapping_gene_indices = set([column_index_dict[gene] for gene in genes if gene in column_index_dict])
 
-        if len(overlapping_genes) > 0:
-            overlapping_gene_indices = [column_names.index(gene) for gene in overlapping_genes]
-            overlapping_gene_indices = [x for x in sorted(overlapping_gene_indices)]
-
-            map_dict[name] = overlapping_gene_indices
+        if len(overlapping_gene_indices) > 0:
+            map_dict[name] = sorted(overlapping_gene_indices)
 
     return map_dict
 
 def save_column_index_map_to_file(fwf_file_path, file_extension, index_dict, value_dict=None):
-    output = b""
+    if len(index_dict) == 0:
+        return
 
-    for name, indices in sorted(index_dict.items()):
-        values = ""
-        if value_dict and name in value_dict and len(value_dict[name]) > 0:
-            values = ",".join([x.decode() for x in value_dict[name]])
+    with open(fwf_file_path + file_extension, 'wb', buffering=1048576) as out_file:
+        for name, indices in sorted(index_dict.items()):
+            out_file.write(name + b"\t")
+            writeJoinedValues(out_file, b",", (str(i).encode() for i in indices))
 
-        if values == "":
-            output += "{}\t{}\n".format(name.decode(), ",".join([str(i) for i in indices])).encode()
-        else:
-            output += "{}\t{}\t{}\n".format(name.decode(), ",".join([str(i) for i in indices]), values).encode()
+            if value_dict and name in value_dict and len(value_dict[name]) > 0:
+                out_file.write(b"\t")
+                writeJoinedValues(out_file, b",", value_dict[name])
 
-    if len(output) > 0:
-        writeStringToFile(fwf_file_path, file_extension, output)
+            out_file.write(b"\n")
 
 def build_alias_dict(tsv_file_path):
     aliases_file_path = tsv_file_path + ".aliases"
@@ -312,8 +397,379 @@ def build_alias_dict(tsv_file_path):
 
     return alias_dict
 
-def merge_fwf_files(in_file_paths, out_file_path):
+# Yields the specified value for the Sample column and then the meta values
+#   (for example, column types) from each input file, excluding its Sample column.
+def iterate_merged_meta_values(in_file_paths, in_file_meta, sample_value, handle_key, length_key):
+    yield sample_value
+
+    for in_file_path in in_file_paths:
+        meta = in_file_meta[in_file_path]
+
+        for col_index in range(1, meta["data_num_cols"]):
+            yield parse_meta_value(meta[handle_key], meta[length_key], col_index).rstrip()
+
+# Saves the matrices and summaries of the column values that DataSetParser uses to
+#   answer queries (QUERY_FILE_EXTENSIONS).
+def save_query_files(fwf_file_path, num_processes=1):
+    save_numeric_matrix(fwf_file_path, num_processes)
+    save_numeric_zone_maps(fwf_file_path)
+    save_discrete_codes(fwf_file_path, num_processes)
+    save_column_histograms(fwf_file_path)
+
+# Saves the values of the numeric columns as floats (NaN if missing) in a binary matrix
+#   with one row per numeric column (.nm). The indices of the numeric columns are saved
+#   in the same order (.nmc), so a column's position in .nmc is its row in the matrix.
+def save_numeric_matrix(fwf_file_path, num_processes=1):
+    numeric_column_indices = [i for i, column_type in enumerate(readStringsFromFile(fwf_file_path, ".ct")) if column_type == b"n"]
+
+    save_column_matrix(fwf_file_path, ".nm", ".nmc", numeric_column_indices, np.float64, num_processes)
+
+# Saves the min and max of each numeric column within each block of rows (a zone map),
+#   so DataSetParser can skip blocks that cannot match a numeric filter. The zone maps
+#   (.nzm) are a .npy file with shape (number of numeric columns, number of blocks, 2),
+#   in the order of .nmc; blocks with only missing values have NaN. The number of rows
+#   per block is saved in .nzb. save_numeric_matrix must be called first. The columns
+#   are processed in blocks of about max_block_bytes.
+def save_numeric_zone_maps(fwf_file_path, rows_per_block=4096, max_block_bytes=67108864):
+    for file_extension in [".nzm", ".nzb"]:
+        if os.path.exists(fwf_file_path + file_extension):
+            os.remove(fwf_file_path + file_extension)
+
+    if not os.path.exists(fwf_file_path + ".nm"):
+        return
+
+    numeric_matrix = np.load(fwf_file_path + ".nm", mmap_mode="r")
+    num_columns, num_rows = numeric_matrix.shape
+    num_blocks = (num_rows + rows_per_block - 1) // rows_per_block
+    columns_per_block = max([1, max_block_bytes // (num_blocks * rows_per_block * 8)])
+    zone_maps = np.full((num_columns, num_blocks, 2), np.nan)
+
+    # Each column's values are contiguous in the matrix, so a block of columns is read at
+    #   a time. The last block of rows is padded with missing values. np.fmin and np.fmax
+    #   ignore missing values (and give NaN if a block of rows has only missing values).
+    padded_values = np.full((columns_per_block, num_blocks * rows_per_block), np.nan)
+
+    for start_slot in range(0, num_columns, columns_per_block):
+        end_slot = min([start_slot + columns_per_block, num_columns])
+        block_values = padded_values[:end_slot - start_slot]
+        block_values[:, :num_rows] = numeric_matrix[start_slot:end_slot]
+        blocks = block_values.reshape(end_slot - start_slot, num_blocks, rows_per_block)
+
+        zone_maps[start_slot:end_slot, :, 0] = np.fmin.reduce(blocks, axis=2)
+        zone_maps[start_slot:end_slot, :, 1] = np.fmax.reduce(blocks, axis=2)
+
+    with open(fwf_file_path + ".nzm", 'wb') as nzm_file:
+        np.save(nzm_file, zone_maps)
+    writeStringToFile(fwf_file_path, ".nzb", str(rows_per_block).encode())
+
+# Saves the values of the discrete columns as codes in a binary matrix with one row per
+#   discrete column (.dcm), and the indices of these columns in the same order (.dcc).
+#   See parse_discrete_categories for what each code means. Columns whose options are
+#   not listed in .cd (because there are too many) are not included.
+def save_discrete_codes(fwf_file_path, num_processes=1):
+    discrete_column_indices = []
+    max_num_categories = 0
+
+    cd_handle = openReadFile(fwf_file_path, ".cd")
+    mcdl = readIntFromFile(fwf_file_path, ".mcdl")
+
+    for i, column_type in enumerate(readStringsFromFile(fwf_file_path, ".ct")):
+        if column_type == b"d":
+            categories = parse_discrete_categories(parse_meta_value(cd_handle, mcdl, i).rstrip())
+
+            if categories != None and len(categories) <= 65536:
+                discrete_column_indices.append(i)
+                max_num_categories = max([max_num_categories, len(categories)])
+
+    cd_handle.close()
+
+    dtype = np.uint8 if max_num_categories <= 256 else np.uint16
+    save_column_matrix(fwf_file_path, ".dcm", ".dcc", discrete_column_indices, dtype, num_processes)
+
+# Saves histograms of the values in the numeric and discrete columns, which DataSetParser
+#   uses to estimate how many rows match a filter. These are built from the matrices
+#   saved by save_numeric_matrix and save_discrete_codes, and are .npy files:
+#     .nh - counts of non-missing values in num_bins equal-width bins between each
+#           numeric column's min and max (one row per column, in the order of .nmc)
+#     .dh - counts of each code in each discrete column, one column after another
+#           (in the order of .dcc); .dho has the position where each column starts
+#   The columns are processed in blocks of about max_block_bytes, and each block is
+#   counted with a single call to np.bincount.
+def save_column_histograms(fwf_file_path, num_bins=20, max_block_bytes=67108864):
+    for file_extension in [".nh", ".dh", ".dho"]:
+        if os.path.exists(fwf_file_path + file_extension):
+            os.remove(fwf_file_path + file_extension)
+
+    if os.path.exists(fwf_file_path + ".nm"):
+        numeric_matrix = np.load(fwf_file_path + ".nm", mmap_mode="r")
+        num_columns, num_rows = numeric_matrix.shape
+        columns_per_block = max([1, max_block_bytes // (num_rows * 8)])
+        histograms = np.zeros((num_columns, num_bins), dtype=np.int64)
+
+        for start_slot in range(0, num_columns, columns_per_block):
+            end_slot = min([start_slot + columns_per_block, num_columns])
+            histograms[start_slot:end_slot] = get_numeric_histograms(np.asarray(numeric_matrix[start_slot:end_slot]), num_bins)
+
+        with open(fwf_file_path + ".nh", 'wb') as nh_file:
+            np.save(nh_file, histograms)
+
+    if os.path.exists(fwf_file_path + ".dcm"):
+        codes_matrix = np.load(fwf_file_path + ".dcm", mmap_mode="r")
+        num_columns, num_rows = codes_matrix.shape
+        columns_per_block = max([1, max_block_bytes // (num_rows * 8)])
+        cd_handle = openReadFile(fwf_file_path, ".cd")
+        mcdl = readIntFromFile(fwf_file_path, ".mcdl")
+
+        num_categories = [len(parse_discrete_categories(parse_meta_value(cd_handle, mcdl, column_index).rstrip())) for column_index in np.load(fwf_file_path + ".dcc").tolist()]
+        offsets = np.cumsum([0] + num_categories).astype(np.int64)
+
+        cd_handle.close()
+
+        # The codes of each column are shifted by where that column's counts start
+        histograms = np.zeros(offsets[-1], dtype=np.int64)
+        for start_slot in range(0, num_columns, columns_per_block):
+            end_slot = min([start_slot + columns_per_block, num_columns])
+            positions = codes_matrix[start_slot:end_slot].astype(np.int64) + (offsets[start_slot:end_slot] - offsets[start_slot])[:, np.newaxis]
+            histograms[offsets[start_slot]:offsets[end_slot]] = np.bincount(positions.ravel(), minlength=offsets[end_slot] - offsets[start_slot])
+
+        with open(fwf_file_path + ".dh", 'wb') as dh_file:
+            np.save(dh_file, histograms)
+        with open(fwf_file_path + ".dho", 'wb') as dho_file:
+            np.save(dho_file, offsets)
+
+# Counts the values in each row of a block of the numeric matrix, using the same bins
+#   as np.histogram with the range set to the row's min and max.
+def get_numeric_histograms(values, num_bins):
+    num_columns = values.shape[0]
+    has_value = ~np.isnan(values)
+
+    # np.fmin and np.fmax ignore NaN (and give NaN if a row has only NaN)
+    first_edges = np.fmin.reduce(values, axis=1)
+    last_edges = np.fmax.reduce(values, axis=1)
+
+    # Like np.histogram, a range with no width is widened by 0.5 on each side
+    same_edges = first_edges == last_edges
+    first_edges[same_edges] -= 0.5
+    last_edges[same_edges] += 0.5
+    first_edges[np.isnan(first_edges)] = 0
+    last_edges[np.isnan(last_edges)] = 1
+
+    bin_edges = np.linspace(first_edges, last_edges, num_bins + 1, axis=1)
+    row_indices = np.broadcast_to(np.arange(num_columns)[:, np.newaxis], values.shape)[has_value]
+    row_values = values[has_value]
+
+    # Find each value's bin, then correct for rounding errors the way np.histogram does
+    norms = num_bins / (last_edges - first_edges)
+    bin_indices = ((row_values - first_edges[row_indices]) * norms[row_indices]).astype(np.int64)
+    bin_indices[bin_indices == num_bins] -= 1
+    bin_indices -= row_values < bin_edges[row_indices, bin_indices]
+    bin_indices += (row_values >= bin_edges[row_indices, bin_indices + 1]) & (bin_indices != num_bins - 1)
+
+    return np.bincount(row_indices * num_bins + bin_indices, minlength=num_columns * num_bins).reshape(num_columns, num_bins)
+
+# Saves a sorted copy of each numeric column (.nsv), with missing values (NaN) last, and
+#   the index of the row that each sorted value came from (.nsr). Both have one row per
+#   column, in the order of .nmc. With these, DataSetParser finds the rows that match a
+#   numeric filter with binary searches. save_numeric_matrix must be called first.
+#   This index is optional; it takes 1.5 times the space of the numeric matrix.
+def save_sorted_numeric_index(fwf_file_path, num_processes=1, columns_per_task=1000):
+    for file_extension in [".nsv", ".nsr"]:
+        if os.path.exists(fwf_file_path + file_extension):
+            os.remove(fwf_file_path + file_extension)
+
+    if not os.path.exists(fwf_file_path + ".nm"):
+        return
+
+    num_columns, num_rows = np.load(fwf_file_path + ".nm", mmap_mode="r").shape
+    np.lib.format.open_memmap(fwf_file_path + ".nsv", mode="w+", dtype=np.float64, shape=(num_columns, num_rows)).flush()
+    np.lib.format.open_memmap(fwf_file_path + ".nsr", mode="w+", dtype=np.uint32, shape=(num_columns, num_rows)).flush()
+
+    args_list = [(fwf_file_path, start_slot, min([start_slot + columns_per_task, num_columns])) for start_slot in range(0, num_columns, columns_per_task)]
+    map_in_processes(save_sorted_numeric_index_columns, args_list, num_processes)
+
+def save_sorted_numeric_index_columns(fwf_file_path, start_slot, end_slot):
+    numeric_matrix = np.load(fwf_file_path + ".nm", mmap_mode="r")
+    sorted_values = np.load(fwf_file_path + ".nsv", mmap_mode="r+")
+    sorted_row_indices = np.load(fwf_file_path + ".nsr", mmap_mode="r+")
+
+    for slot in range(start_slot, end_slot):
+        values = numeric_matrix[slot]
+        order = np.argsort(values, kind="stable")
+
+        sorted_values[slot] = values[order]
+        sorted_row_indices[slot] = order
+
+    sorted_values.flush()
+    sorted_row_indices.flush()
+
+# Saves an inverted index for the discrete columns in .dcm: for each code in each column,
+#   the sorted indices of the rows that have that code (a posting list). The lists are
+#   in the same order as the counts in .dh, so the list for a code is at position
+#   .dho[slot] + code. Each list is stored as differences between consecutive row
+#   indices (uint32) and compressed with zlib (.dp); .dpo has the position where each
+#   list starts in .dp. save_column_histograms must be called first.
+def save_discrete_postings(fwf_file_path):
+    for file_extension in [".dp", ".dpo"]:
+        if os.path.exists(fwf_file_path + file_extension):
+            os.remove(fwf_file_path + file_extension)
+
+    if not os.path.exists(fwf_file_path + ".dho"):
+        return
+
+    codes_matrix = np.load(fwf_file_path + ".dcm", mmap_mode="r")
+    histogram_offsets = np.load(fwf_file_path + ".dho")
+    posting_offsets = [0]
+
+    with open(fwf_file_path + ".dp", 'wb') as dp_file:
+        for slot in range(codes_matrix.shape[0]):
+            # A stable sort groups the rows by code and keeps them in order within each code.
+            codes = codes_matrix[slot]
+            row_indices = np.argsort(codes, kind="stable").astype(np.uint32)
+            code_ends = np.cumsum(np.bincount(codes, minlength=histogram_offsets[slot + 1] - histogram_offsets[slot]))
+
+            start = 0
+            for end in code_ends.tolist():
+                posting_list = zlib.compress(np.diff(row_indices[start:end], prepend=np.uint32(0)).astype(np.uint32).tobytes())
+                dp_file.write(posting_list)
+                posting_offsets.append(posting_offsets[-1] + len(posting_list))
+                start = end
+
+    with open(fwf_file_path + ".dpo", 'wb') as dpo_file:
+        np.save(dpo_file, np.array(posting_offsets, dtype=np.int64))
+
+# Saves the values of the specified columns in a binary matrix with one row per column.
+#   Both the matrix and the column indices are .npy files, so they can be memory mapped.
+#   The matrix is filled in blocks of rows (in parallel if num_processes > 1).
+def save_column_matrix(fwf_file_path, matrix_file_extension, indices_file_extension, column_indices, dtype, num_processes=1, max_block_bytes=67108864):
+    for file_extension in [matrix_file_extension, indices_file_extension]:
+        if os.path.exists(fwf_file_path + file_extension):
+            os.remove(fwf_file_path + file_extension)
+
+    num_rows = readIntFromFile(fwf_file_path, ".nrow")
+
+    if len(column_indices) == 0 or num_rows == 0:
+        return
+
+    with open(fwf_file_path + indices_file_extension, 'wb') as indices_file:
+        np.save(indices_file, np.array(column_indices, dtype=np.int64))
+
+    np.lib.format.open_memmap(fwf_file_path + matrix_file_extension, mode="w+", dtype=dtype, shape=(len(column_indices), num_rows)).flush()
+
+    rows_per_block = max([1, max_block_bytes // readIntFromFile(fwf_file_path, ".ll")])
+    args_list = [(fwf_file_path, matrix_file_extension, indices_file_extension, start_row, min([start_row + rows_per_block, num_rows])) for start_row in range(0, num_rows, rows_per_block)]
+    map_in_processes(save_column_matrix_rows, args_list, num_processes)
+
+def save_column_matrix_rows(fwf_file_path, matrix_file_extension, indices_file_extension, start_row, end_row):
+    ll = readIntFromFile(fwf_file_path, ".ll")
+    cc_handle = openReadFile(fwf_file_path, ".cc")
+    mccl = readIntFromFile(fwf_file_path, ".mccl")
+    column_indices = np.load(fwf_file_path + indices_file_extension).tolist()
+    col_coords = list(parse_data_coords(column_indices, cc_handle, mccl))
+
+    with open(fwf_file_path, 'rb') as data_file:
+        data_file.seek(start_row * ll)
+        rows = np.frombuffer(data_file.read((end_row - start_row) * ll), dtype=np.uint8).reshape(end_row - start_row, ll)
+
+    matrix = np.load(fwf_file_path + matrix_file_extension, mmap_mode="r+")
+
+    if matrix.dtype.kind == "f":
+        for slot, coords in enumerate(col_coords):
+            matrix[slot, start_row:end_row] = parse_numeric_array(rows[:, coords[1]:coords[2]])
+    else:
+        cd_handle = openReadFile(fwf_file_path, ".cd")
+        mcdl = readIntFromFile(fwf_file_path, ".mcdl")
+
+        for slot, coords in enumerate(col_coords):
+            categories = parse_discrete_categories(parse_meta_value(cd_handle, mcdl, coords[0]).rstrip())
+            matrix[slot, start_row:end_row] = encode_discrete_array(rows[:, coords[1]:coords[2]], categories)
+
+        cd_handle.close()
+
+    matrix.flush()
+    cc_handle.close()
+
+# Saves the sample IDs (and the row index of each) sorted by sample ID. This allows
+#   files to be merged by reading each of these files sequentially.
+#   If a sample ID is duplicated, the last row is used.
+def save_sorted_sample_order(fwf_file_path):
+    data_handle = openReadFile(fwf_file_path)
+    ll = readIntFromFile(fwf_file_path, ".ll")
+    cc_handle = openReadFile(fwf_file_path, ".cc")
+    mccl = readIntFromFile(fwf_file_path, ".mccl")
+    num_rows = readIntFromFile(fwf_file_path, ".nrow")
+    col_coords = list(parse_data_coords([0], cc_handle, mccl))
+
+    sample_rows = sorted([(sample_id.rstrip(), row_index) for row_index, sample_id in enumerate(parse_column_values(data_handle, num_rows, col_coords, ll, 0, 0))])
+
+    with open(fwf_file_path + ".ss", 'wb') as ss_file:
+        for i, (sample_id, row_index) in enumerate(sample_rows):
+            if i + 1 < len(sample_rows) and sample_rows[i + 1][0] == sample_id:
+                continue
+
+            ss_file.write(sample_id + b"\t" + str(row_index).encode() + b"\n")
+
+    data_handle.close()
+    cc_handle.close()
+
+def iterate_sorted_samples(fwf_file_path, file_index):
+    with open(fwf_file_path + ".ss", 'rb') as ss_file:
+        for line in ss_file:
+            sample_id, row_index = line.rstrip(b"\n").rsplit(b"\t", 1)
+            yield sample_id, file_index, int(row_index)
+
+# Performs a k-way merge of the sorted sample order of each file. For each unique
+#   sample ID (in sorted order), this yields the ID and a list with the row index
+#   of that sample in each file (None if the sample is not in that file).
+def iterate_merged_samples(fwf_file_paths):
+    sorted_samples = heapq.merge(*[iterate_sorted_samples(fwf_file_path, i) for i, fwf_file_path in enumerate(fwf_file_paths)])
+
+    current_sample_id = None
+    row_indices = None
+
+    for sample_id, file_index, row_index in sorted_samples:
+        if sample_id != current_sample_id:
+            if current_sample_id != None:
+                yield current_sample_id, row_indices
+
+            current_sample_id = sample_id
+            row_indices = [None for fwf_file_path in fwf_file_paths]
+
+        row_indices[file_index] = row_index
+
+    if current_sample_id != None:
+        yield current_sample_id, row_indices
+
+# Builds a block of merged rows and writes it at the specified position in the output file.
+#   For each input file, in_file_coords has the file path, line length, and the position where
+#   the Sample column ends. The columns after the Sample column are contiguous, so these are
+#   copied as a single slice.
+def write_merged_rows(in_file_coords, out_file_path, block, longest_sample_id, out_start_pos):
+    data_handles = [openReadFile(in_file_path) for in_file_path, ll, sample_end_pos in in_file_coords]
+    out_pieces = []
+
+    for sample_id, row_indices in block:
+        out_pieces.append(sample_id.ljust(longest_sample_id))
+
+        for data_handle, (in_file_path, ll, sample_end_pos), row_index in zip(data_handles, in_file_coords, row_indices):
+            if row_index == None:
+                # Fill in missing data points with spaces
+                out_pieces.append(b" " * (ll - 1 - sample_end_pos))
+            else:
+                out_pieces.append(data_handle[(row_index * ll + sample_end_pos):(row_index * ll + ll - 1)])
+
+        out_pieces.append(b"\n")
+
+    out_fd = os.open(out_file_path, os.O_WRONLY)
+    os.pwrite(out_fd, b"".join(out_pieces), out_start_pos)
+    os.close(out_fd)
+
+    for data_handle in data_handles:
+        data_handle.close()
+
+# See convert_tsv_to_fwf for what build_query_files does.
+def merge_fwf_files(in_file_paths, out_file_path, num_processes=1, build_query_files=True):
     in_file_paths = sorted(in_file_paths)
+    remove_optional_files(out_file_path)
 
     # Open files for reading and pull metadata
     in_file_meta = {}
@@ -333,40 +789,23 @@ def merge_fwf_files(in_file_paths, out_file_path):
         meta["cd_handle"] = openReadFile(in_file_path, ".cd")
         meta["mcdl"] = readIntFromFile(in_file_path, ".mcdl")
 
-        meta["sample_lookup"] = {}
-        for i, sample_id in zip(range(meta["data_num_rows"]), parse_column_values(meta["data_handle"], meta["data_num_rows"], meta["col_coords"], meta["ll"], 0, 0)):
-            meta["sample_lookup"][sample_id] = i
+        # Files created by older versions do not have the sorted sample order
+        if not os.path.exists(in_file_path + ".ss"):
+            save_sorted_sample_order(in_file_path)
 
         in_file_meta[in_file_path] = meta
 
-    # Find unique sample IDs
-    all_sample_ids = set()
-    for in_file_path in in_file_paths:
-        meta = in_file_meta[in_file_path]
-        for sample_id in meta["sample_lookup"]:
-            all_sample_ids.add(sample_id)
-    all_sample_ids = sorted(list(all_sample_ids))
-
     # The widths of the Sample columns could be different in different files,
     #   so we need to deal with that. Check the meta values and find the longest.
-    longest_sample_id = getMaxStringLength([x for x in all_sample_ids])
+    longest_sample_id = max([in_file_meta[in_file_path]["col_coords"][0][2] for in_file_path in in_file_paths])
 
     # Calculate the column start coordinates for the merged data
-    column_start_coords = [b"0"]
-    cumulative_position = longest_sample_id
-
+    merged_column_sizes = [longest_sample_id]
     for in_file_path in in_file_paths:
-        col_coords = in_file_meta[in_file_path]["col_coords"]
-
-        for i in range(1, len(col_coords)):
-            column_size = col_coords[i][2] - col_coords[i][1]
-            column_start_coords.append(str(cumulative_position).encode())
-            cumulative_position += column_size
+        merged_column_sizes.extend([coords[2] - coords[1] for coords in in_file_meta[in_file_path]["col_coords"][1:]])
 
-    column_start_coords.append(str(cumulative_position).encode())
-    column_coords_string, max_column_coord_length = buildStringMap(column_start_coords)
-    writeStringToFile(out_file_path, ".cc", column_coords_string)
-    writeStringToFile(out_file_path, ".mccl", max_column_coord_length)
+    line_length = sum(merged_column_sizes)
+    writeFixedWidthFile(out_file_path, ".cc", ".mccl", iterate_column_coords(merged_column_sizes), len(str(line_length)))
 
     # Merge column names and pathway information
     original_column_names = [b"Sample"]
@@ -375,24 +814,26 @@ def merge_fwf_files(in_file_paths, out_file_path):
     group_dict = {}
 
     for in_file_path in in_file_paths:
-        pathway_gene_indices_dict = {}
+        # Map each column index to the pathways that contain it
+        column_pathways_dict = {}
         pathways_file_path = in_file_path + ".pathways"
         if os.path.exists(pathways_file_path):
             with open(pathways_file_path, 'rb') as pathways_file:
                 for line in pathways_file:
                     line_items = line.rstrip(b"\n").split(b"\t")
-                    pathway_gene_indices_dict[line_items[0]] = [int(x) for x in line_items[1].split(b",")]
+
+                    for col_index in line_items[1].split(b","):
+                        column_pathways_dict.setdefault(int(col_index), []).append(line_items[0])
+
+        in_file_extension = os.path.splitext(in_file_path)[1]
+        prefix = os.path.basename(in_file_path).replace(in_file_extension, "").encode()
 
         for col_index in range(1, in_file_meta[in_file_path]["data_num_cols"]):
             column_name = parse_meta_value(in_file_meta[in_file_path]["cn_handle"], in_file_meta[in_file_path]["mcnl"], col_index).rstrip()
             original_column_names.append(column_name)
 
-            for pathway_name, gene_indices in pathway_gene_indices_dict.items():
-                if col_index in gene_indices:
-                    merged_pathway_gene_dict[pathway_name] = merged_pathway_gene_dict.setdefault(pathway_name, []) + [column_name]
-
-            in_file_extension = os.path.splitext(in_file_path)[1]
-            prefix = os.path.basename(in_file_path).replace(in_file_extension, "").encode()
+            for pathway_name in column_pathways_dict.get(col_index, []):
+                merged_pathway_gene_dict.setdefault(pathway_name, []).append(column_name)
 
             merged_column_name = "{}__{}".format(prefix.decode(), column_name.decode()).encode()
             merged_column_names.append(merged_column_name)
@@ -402,9 +843,7 @@ def merge_fwf_files(in_file_paths, out_file_path):
             group_dict[prefix].append(column_name)
 
     # Save merged column names to file
-    column_names_string, max_column_names_length = buildStringMap(merged_column_names)
-    writeStringToFile(out_file_path, ".cn", column_names_string)
-    writeStringToFile(out_file_path, ".mcnl", max_column_names_length)
+    writeFixedWidthFile(out_file_path, ".cn", ".mcnl", merged_column_names, getMaxStringLength(merged_column_names))
 
     # Save pathway gene indices to file
     pathway_gene_indices_dict = map_column_name_dict_to_indices(merged_pathway_gene_dict, original_column_names)
@@ -414,51 +853,53 @@ def merge_fwf_files(in_file_paths, out_file_path):
     group_indices_dict = map_column_name_dict_to_indices(group_dict, original_column_names)
     save_column_index_map_to_file(out_file_path, ".groups", group_indices_dict, group_dict)
 
-    # Calculate the column types and descriptions for the merged data
-    column_types = [b"i"] # This is the Sample column
-    column_descriptions = [get_column_description(b"i", all_sample_ids)]
+    # Output the merged data values (and the sorted sample order, which is the row order).
+    #   Every merged row has the same length, so blocks of rows can be built and written
+    #   independently (in parallel if requested).
+    writeStringToFile(out_file_path, ".ll", str(line_length + 1).encode())
 
-    for in_file_path in in_file_paths:
-        for col_index in range(1, in_file_meta[in_file_path]["data_num_cols"]):
-            column_types.append(parse_meta_value(in_file_meta[in_file_path]["ct_handle"], in_file_meta[in_file_path]["mctl"], col_index))
-            column_descriptions.append(parse_meta_value(in_file_meta[in_file_path]["cd_handle"], in_file_meta[in_file_path]["mcdl"], col_index))
+    in_file_coords = [(in_file_path, in_file_meta[in_file_path]["ll"], in_file_meta[in_file_path]["col_coords"][0][2]) for in_file_path in in_file_paths]
+    rows_per_block = max([1, 4194304 // (line_length + 1)])
 
-    # Save column types to file
-    column_types_string, max_column_types_length = buildStringMap(column_types)
-    writeStringToFile(out_file_path, ".ct", column_types_string)
-    writeStringToFile(out_file_path, ".mctl", max_column_types_length)
+    open(out_file_path, 'wb').close()
 
-    # Save column descriptions to file
-    column_desc_string, max_column_desc_length = buildStringMap(column_descriptions)
-    writeStringToFile(out_file_path, ".cd", column_desc_string)
-    writeStringToFile(out_file_path, ".mcdl", max_column_desc_length)
+    num_samples = 0
+    with open(out_file_path + ".ss", 'wb') as ss_file:
+        def iterate_blocks():
+            nonlocal num_samples
+            block = []
 
-    # Output the merged data values and meta values
-    with open(out_file_path, 'wb') as out_file:
-        chunk_size = 1000
-        out_lines = []
-        for i, sample_id in enumerate(all_sample_ids):
-            out_line = format_string(sample_id, longest_sample_id)
+            for sample_id, row_indices in iterate_merged_samples(in_file_paths):
+                block.append((sample_id, row_indices))
+                ss_file.write(sample_id + b"\t" + str(num_samples).encode() + b"\n")
+                num_samples += 1
+
+                if len(block) == rows_per_block:
+                    yield (in_file_coords, out_file_path, block, longest_sample_id, (num_samples - len(block)) * (line_length + 1))
+                    block = []
 
-            for in_file_path in in_file_paths:
-                meta = in_file_meta[in_file_path]
-                out_line += parse_row_for_sample(meta, sample_id, meta["col_coords"][1:]).rstrip(b"\n")
+            if len(block) > 0:
+                yield (in_file_coords, out_file_path, block, longest_sample_id, (num_samples - len(block)) * (line_length + 1))
 
-            out_lines.append(out_line)
+        apply_in_processes(write_merged_rows, iterate_blocks(), num_processes)
 
-            if len(out_lines) % chunk_size == 0:
-                out_file.write(b"\n".join(out_lines) + b"\n")
-                out_lines = []
+    # Save the column types and descriptions for the merged data. These are copied from
+    #   the input files, so their widths in the input files are bounds for the merged widths.
+    sample_description = "{}|ID".format(num_samples).encode()
+    data_in_file_paths = [x for x in in_file_paths if in_file_meta[x]["data_num_cols"] > 1]
 
-            if i == 0:
-                writeStringToFile(out_file_path, ".ll", str(len(out_line) + 1).encode())
+    max_column_types_length = max([1] + [in_file_meta[x]["mctl"] for x in data_in_file_paths])
+    writeFixedWidthFile(out_file_path, ".ct", ".mctl", iterate_merged_meta_values(in_file_paths, in_file_meta, b"i", "ct_handle", "mctl"), max_column_types_length)
 
-        if len(out_lines) > 0:
-            out_file.write(b"\n".join(out_lines) + b"\n")
+    max_column_desc_length = max([len(sample_description)] + [in_file_meta[x]["mcdl"] for x in data_in_file_paths])
+    writeFixedWidthFile(out_file_path, ".cd", ".mcdl", iterate_merged_meta_values(in_file_paths, in_file_meta, sample_description, "cd_handle", "mcdl"), max_column_desc_length)
 
     # Save num rows and cols
-    writeStringToFile(out_file_path, ".nrow", str(len(all_sample_ids)).encode())
-    writeStringToFile(out_file_path, ".ncol", str(len(column_types)).encode())
+    writeStringToFile(out_file_path, ".nrow", str(num_samples).encode())
+    writeStringToFile(out_file_path, ".ncol", str(len(merged_column_names)).encode())
+
+    if build_query_files:
+        save_query_files(out_file_path, num_processes)
 
     for meta in in_file_meta.values():
         for key, value in meta.items():
@@ -1,7 +1,10 @@
 import fastnumbers
+from itertools import islice
 import mmap
+import numpy as np
 import os
 import re
+import struct
 import sys
 import tempfile
 import time
@@ -34,6 +37,41 @@ def parse_data_values(start_offset, segment_length, data_coords, str_like_object
     for coords in data_coords:
         yield str_like_object[(start_pos + coords[1]):(start_pos + coords[2] + end_offset)]
 
+# Compiles column coordinates (from parse_data_coords) into a plan for extracting the
+#   values from a row at once. Adjacent columns are read as a single run, and the
+#   struct skips the gaps between runs and splits each run into values. The plan
+#   is the position of the first value in the row and the struct. Returns None if
+#   the columns are not in increasing order.
+def compile_extraction_plan(data_coords):
+    if len(data_coords) == 0:
+        return 0, struct.Struct("")
+
+    start_position = data_coords[0][1]
+    position = start_position
+    format_parts = []
+
+    for coords in data_coords:
+        if coords[1] < position:
+            return None
+        if coords[1] > position:
+            format_parts.append("{}x".format(coords[1] - position))
+
+        format_parts.append("{}s".format(coords[2] - coords[1]))
+        position = coords[2]
+
+    return start_position, struct.Struct("".join(format_parts))
+
+# Returns a tuple with the values in a row, using a plan from compile_extraction_plan.
+#   Memory-mapped files are read without copying the row.
+def parse_row_values(start_offset, segment_length, extraction_plan, str_like_object):
+    start_position, row_struct = extraction_plan
+    start_pos = start_offset * segment_length + start_position
+
+    if isinstance(str_like_object, mmap.mmap):
+        return row_struct.unpack_from(str_like_object, start_pos)
+
+    return row_struct.unpack(str_like_object[start_pos:(start_pos + row_struct.size)])
+
 def readStringFromFile(file_path, file_extension=""):
     with open(file_path + file_extension, 'rb') as the_file:
         return the_file.read().rstrip()
@@ -64,6 +102,81 @@ def writeStringToFile(file_path, file_extension, the_string):
     with open(file_path + file_extension, 'wb') as the_file:
         the_file.write(the_string)
 
+# The values can come from a generator.
+def getMaxStringLength(values):
+    return max((len(x) for x in values), default=0)
+
+# Writes each value on its own line, padded with spaces to max_length, and saves
+#   max_length to a separate file (so values can be found by position). Pass a known
+#   bound as max_length, or find it with getMaxStringLength. The values can come from
+#   a generator and are written through a buffer, so they are never all held in memory.
+def writeFixedWidthFile(file_path, file_extension, max_length_file_extension, values, max_length):
+    with open(file_path + file_extension, 'wb', buffering=1048576) as the_file:
+        for value in values:
+            the_file.write(value.ljust(max_length) + b"\n")
+
+    writeStringToFile(file_path, max_length_file_extension, str(max_length).encode())
+
+# Writes the values with a separator between each, without joining them all in memory.
+def writeJoinedValues(the_file, separator, values, chunk_size=10000):
+    values = iter(values)
+    chunk = list(islice(values, chunk_size))
+
+    while len(chunk) > 0:
+        the_file.write(separator.join(chunk))
+        chunk = list(islice(values, chunk_size))
+
+        if len(chunk) > 0:
+            the_file.write(separator)
+
+# Converts fixed-width values, given as a (num_rows, width) array of bytes (uint8),
+#   to floats. Missing values ("" or "NA") become NaN.
+def parse_numeric_array(value_bytes):
+    num_rows, width = value_bytes.shape
+    if width == 0:
+        return np.full(num_rows, np.nan)
+
+    values = np.char.strip(np.ascontiguousarray(value_bytes).view("S{}".format(width)).ravel())
+    missing = (values == b"") | (values == b"NA")
+
+    try:
+        return np.where(missing, np.nan, np.where(missing, b"nan", values).astype(np.float64))
+    except ValueError:
+        # A few formats that fastnumbers accepts (for example, hexadecimal) are not parsed by NumPy.
+        return np.array([np.nan if is_missing else fastnumbers.float(x) for x, is_missing in zip(values, missing)])
+
+# Parses the description of a discrete column (from .cd) and returns the category
+#   for each code: 0 is "" (missing), 1 is "NA", and the listed options follow.
+#   Returns None if the options are not listed or if an option contains a comma.
+def parse_discrete_categories(description):
+    description_parts = description.split(b"|", 1)
+
+    if len(description_parts) < 2 or description_parts[1] == b"ID":
+        return None
+
+    options = description_parts[1].split(b",")
+    if len(options) != int(description_parts[0]):
+        return None
+
+    return [b"", b"NA"] + options
+
+# Converts fixed-width values, given as a (num_rows, width) array of bytes (uint8),
+#   to the codes of the specified categories (see parse_discrete_categories).
+def encode_discrete_array(value_bytes, categories):
+    num_rows, width = value_bytes.shape
+    if width == 0:
+        return np.zeros(num_rows, dtype=np.int64)
+
+    values = np.char.rstrip(np.ascontiguousarray(value_bytes).view("S{}".format(width)).ravel())
+    categories = np.array(categories)
+    order = np.argsort(categories, kind="stable")
+
+    codes = order[np.minimum(np.searchsorted(categories[order], values), len(categories) - 1)]
+    if not np.array_equal(categories[codes], values):
+        raise Exception("A value is not among the options for the column.")
+
+    return codes
+
 def countFileLines(file_path, file_extension=""):
     num_lines = 0
 
@@ -1,14 +1,44 @@
+from collections import OrderedDict
 import fastnumbers
 import glob
 from itertools import islice
 import mmap
+from multiprocessing import Pool
+import numpy as np
 import operator
 import os
 import sys
+import threading
+import zlib
+from ColumnarOutput import *
+from CompressedFwf import *
 from DataSetHelper import *
 from DiscreteFilter import *
+from FilterExpression import *
 from NumericFilter import *
 
+# Parsers that get_parser() keeps open in this process, keyed by data file path
+#   (least recently used first). Each value is a tuple with the parser and the
+#   dataset's timestamp when the parser was opened.
+open_parsers = OrderedDict()
+open_parsers_lock = threading.Lock()
+
+# get_parser() closes the least recently used parsers when the parsers it keeps open
+#   have more than this many files open or more than this many bytes memory mapped.
+MAX_OPEN_PARSER_FILES = 256
+MAX_OPEN_PARSER_BYTES = 8 * 1024 ** 3
+
+# The minimum number of bytes in each chunk that iter_query() generates.
+DEFAULT_OUTPUT_CHUNK_SIZE = 1024 ** 2
+
+# When the output is built in parallel, each process extracts as many rows at a time as
+#   take up this many bytes in the data file (at least one row).
+DEFAULT_OUTPUT_TASK_BYTES = 8 * 1024 ** 2
+
+# The number of bytes read from the data file for each batch of rows when saving output
+#   in a binary format (see ColumnarOutput.py).
+DEFAULT_OUTPUT_BATCH_BYTES = 16 * 1024 ** 2
+
 class DataSetParser:
     def __init__(self, data_file_path):
         self.data_file_path = data_file_path
@@ -21,6 +51,25 @@ class DataSetParser:
         self.__num_features = None
         self.__total_datapoints = None
 
+        # Decompressed blocks, if the data file has been compressed (see CompressedFwfFile)
+        self.__block_cache = BlockCache()
+
+        # Memory-mapped column matrices (and their column indices), keyed by file extension
+        self.__column_matrices = {}
+
+        # The inverted index for discrete columns (see save_discrete_postings), loaded when first used
+        self.__postings = None
+
+        # These are used when the parser is used as a context manager (see __enter__)
+        self.__open_handles = None
+        self.__cached_ints = None
+        self.__column_starts = None
+        self.__enter_count = 0
+
+        # A parser from get_parser() can be shared by several threads, so the files and
+        #   values above that are loaded when first used are guarded by this lock.
+        self.__lock = threading.RLock()
+
     @property
     def id(self) -> str:
         if self.__id == None:
@@ -63,50 +112,125 @@ class DataSetParser:
             self.__total_datapoints = self.num_samples * self.num_features
         return self.__total_datapoints
 
-    # This function accepts filtering criteria, saves the matching row indices to a file,
-    #   and returns the number of matching samples as well as the path to that file.
+    # The parser can be used as a context manager (with DataSetParser(path) as parser:).
+    #   Then the data file and the files it needs to read values (.cc and .cd) are opened
+    #   once and kept open, and the line lengths and column coordinates are read once,
+    #   until the end of the with block. This helps when making many calls in a row.
+    #   With blocks can be nested (for example, with a parser from get_parser()); the
+    #   files are closed at the end of the outermost one.
+    def __enter__(self):
+        with self.__lock:
+            if self.__enter_count == 0:
+                self.__open_handles = {}
+                self.__cached_ints = {}
+
+            self.__enter_count += 1
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        with self.__lock:
+            self.__enter_count -= 1
+
+            if self.__enter_count == 0:
+                self.close()
+
+    def close(self):
+        with self.__lock:
+            if self.__open_handles != None:
+                for handle in self.__open_handles.values():
+                    handle.close()
+
+            self.__open_handles = None
+            self.__cached_ints = None
+            self.__column_starts = None
+            self.__enter_count = 0
+
+    # This function accepts filtering criteria and returns the indices of the matching
+    #   rows (in order) as a numpy array.
     # The input arguments must be of type DiscreteFilter or NumericFilter, respectively.
-    # Make sure to delete the temp file after you are done with it!
-    def save_sample_indices_matching_filters(self, discrete_filters, numeric_filters):
+    #   Rows must also match filter_expression, if specified (see FilterExpression.py).
+    def find_sample_indices_matching_filters(self, discrete_filters, numeric_filters, filter_expression=None):
         # Prepare to parse data
-        data_handle = openReadFile(self.data_file_path)
-        ll = readIntFromFile(self.data_file_path, ".ll")
-        cc_handle = openReadFile(self.data_file_path, ".cc")
-        mccl = readIntFromFile(self.data_file_path, ".mccl")
+        data_handle = self.open_file()
+        ll = self.read_int(".ll")
+        cc_handle = self.open_file(".cc")
+        mccl = self.read_int(".mccl")
         num_rows = self.num_samples
 
         # Read the column names
         all_column_names = get_column_names(self.data_file_path)
 
-        # Find rows that match discrete filtering criteria
-        keep_row_indices = range(num_rows)
-        for df in discrete_filters:
-            keep_row_indices = self.filter_rows_discrete(keep_row_indices, df, data_handle, cc_handle, mccl, ll)
-
-        # Find rows that match numeric filtering criteria
         num_operator_dict = {">": operator.gt, "<": operator.lt, ">=": operator.ge, "<=": operator.le, "==": operator.eq, "!=": operator.ne}
-        for nf in numeric_filters:
-            keep_row_indices = self.filter_rows_numeric(keep_row_indices, nf, num_operator_dict, data_handle, cc_handle, mccl, ll)
 
-        # Save the row indices to a file
-        keep_row_indices = [str(x).encode() for x in keep_row_indices]
+        # Apply the most selective filters first, so the others see fewer rows.
+        plan = [the_filter for selectivity, source, the_filter in self.plan_filters(discrete_filters, numeric_filters, num_operator_dict)]
+
+        if isinstance(data_handle, mmap.mmap):
+            # Evaluate each filter for all remaining rows at once. Each row of this array is a line in the file.
+            rows = np.frombuffer(data_handle, dtype=np.uint8, count=num_rows * ll).reshape(num_rows, ll)
+
+            keep_row_indices = np.arange(num_rows)
+            for the_filter in plan:
+                if isinstance(the_filter, DiscreteFilter):
+                    keep_row_indices = keep_row_indices[self.find_discrete_matches(the_filter, keep_row_indices, rows, cc_handle, mccl)]
+                else:
+                    keep_row_indices = keep_row_indices[self.find_numeric_matches(the_filter, num_operator_dict, keep_row_indices, rows, cc_handle, mccl)]
+
+            if filter_expression != None:
+                matches = self.find_expression_matches(filter_expression, num_rows, num_operator_dict, data_handle, rows, cc_handle, mccl, ll)
+                keep_row_indices = keep_row_indices[matches[keep_row_indices]]
+
+            # The file cannot be closed while the array refers to it.
+            del rows
+        else:
+            keep_row_indices = range(num_rows)
+            for the_filter in plan:
+                if isinstance(the_filter, DiscreteFilter):
+                    keep_row_indices = self.filter_rows_discrete(keep_row_indices, the_filter, data_handle, cc_handle, mccl, ll)
+                else:
+                    keep_row_indices = self.filter_rows_numeric(keep_row_indices, the_filter, num_operator_dict, data_handle, cc_handle, mccl, ll)
+
+            if filter_expression != None:
+                matches = self.find_expression_matches(filter_expression, num_rows, num_operator_dict, data_handle, None, cc_handle, mccl, ll)
+                keep_row_indices = (row_index for row_index in keep_row_indices if matches[row_index])
+
+            keep_row_indices = np.fromiter(keep_row_indices, dtype=np.int64)
+
+        self.close_file(data_handle)
+        self.close_file(cc_handle)
+
+        return keep_row_indices
+
+    # This function is kept for compatibility with callers that read the matching row
+    #   indices from a file. It calls find_sample_indices_matching_filters (so all of the
+    #   indices are held in memory) and then writes them to a temp file, one per line.
+    #   It returns the number of matching samples and the path to that file.
+    # Make sure to delete the temp file after you are done with it!
+    def save_sample_indices_matching_filters(self, discrete_filters, numeric_filters, filter_expression=None):
+        keep_row_indices = self.find_sample_indices_matching_filters(discrete_filters, numeric_filters, filter_expression)
+
         temp_file_path = self.generate_temp_file_path()
         with open(temp_file_path, "wb") as temp_file:
-            temp_file.write(b"\n".join(keep_row_indices))
-
-        data_handle.close()
-        cc_handle.close()
+            writeJoinedValues(temp_file, b"\n", (str(x).encode() for x in keep_row_indices.tolist()))
 
         return len(keep_row_indices), temp_file_path
 
+    # This function returns the order in which save_sample_indices_matching_filters
+    #   would apply the filters, which is helpful for finding out why a query is slow.
+    #   It returns a list of tuples. Each tuple has a description of the filter, the
+    #   estimated fraction of rows that match it, and how this was estimated.
+    def explain(self, discrete_filters, numeric_filters):
+        num_operator_dict = {">": operator.gt, "<": operator.lt, ">=": operator.ge, "<=": operator.le, "==": operator.eq, "!=": operator.ne}
+
+        return [(repr(the_filter), selectivity, source) for selectivity, source, the_filter in self.plan_filters(discrete_filters, numeric_filters, num_operator_dict)]
+
     # This function identifies which columns should be selected based on the specified
-    #   columns, groups, and pathways. It returns the number of columns to be selected,
-    #   a file path that contains the indices of the selected columns, and a file path
-    #   that contains the names of the selected columns (in that order).
+    #   columns, groups, and pathways. It returns the indices of the selected columns
+    #   (as a numpy array) and a list with the names of the selected columns.
     # The input arguments should be lists of strings. If all the lists are empty, then
     #   all columns will be selected.
-    # Make sure to delete the temp file after you are done with it!
-    def save_column_indices_to_select(self, select_columns, select_groups, select_pathways):
+    def find_column_indices_to_select(self, select_columns, select_groups, select_pathways):
         # Read the column names
         column_names = list(readStringsFromFile(self.data_file_path, ".cn"))
 
@@ -124,75 +248,141 @@ class DataSetParser:
 
         select_column_indices = sorted(list(select_column_indices))
 
+        return np.array(select_column_indices, dtype=np.int64), [column_names[i] for i in select_column_indices]
+
+    # This function does the same as find_column_indices_to_select, but it saves the
+    #   indices and names to files. It returns the number of columns to be selected,
+    #   a file path that contains the indices of the selected columns, and a file path
+    #   that contains the names of the selected columns (in that order).
+    # Make sure to delete the temp file after you are done with it!
+    def save_column_indices_to_select(self, select_columns, select_groups, select_pathways):
+        select_column_indices, select_column_names = self.find_column_indices_to_select(select_columns, select_groups, select_pathways)
+
         # Save the column indices to a file
         temp_file_path_indices = self.generate_temp_file_path()
         with open(temp_file_path_indices, "wb") as temp_file:
-            temp_file.write(b"\n".join([str(i).encode() for i in select_column_indices]))
+            temp_file.write(b"\n".join([str(i).encode() for i in select_column_indices.tolist()]))
 
         # Save the column names to a file
         temp_file_path_names = self.generate_temp_file_path()
         with open(temp_file_path_names, "wb") as temp_file:
-            temp_file.write(b"\t".join([column_names[i] for i in select_column_indices]))
+            temp_file.write(b"\t".join(select_column_names))
 
         return len(select_column_indices), temp_file_path_indices, temp_file_path_names
 
     # This function retrieves data for the specified rows and columns and builds
     #   a file with the data. The first two arguments should be paths to files created
     #   using the above functions. The third argument indicates the path where the
-    #   output file will be saved. The fourth argument is the type/format of the output file.
+    #   output file will be saved. The fourth argument is the type/format of the output file:
+    #   tsv, arrow (Arrow IPC), parquet, npy (a structured array), or npz (an array per column).
+    #   Numeric columns are saved as floats in the binary formats; arrow and parquet need pyarrow.
+    #   If num_processes is greater than 1, tsv rows are extracted in parallel (see iter_output).
     # This function does not return anything.
-    #### NOTE: Temporarily, tsv is the only supported option for the output file type.
-    def build_output_file(self, row_indices_file_path, col_indices_file_path, col_names_file_path, out_file_path, out_file_type):
+    def build_output_file(self, row_indices_file_path, col_indices_file_path, col_names_file_path, out_file_path, out_file_type, num_processes=1):
         row_indices = []
         if os.path.getsize(row_indices_file_path) > 0:
             row_indices = readIntsFromFile(row_indices_file_path)
 
-        # This is a generator
-        col_indices = readIntsFromFile(col_indices_file_path)
-
-        # Prepare to parse data
-        data_handle = openReadFile(self.data_file_path)
-        ll = readIntFromFile(self.data_file_path, ".ll")
-        cc_handle = openReadFile(self.data_file_path, ".cc")
-        mccl = readIntFromFile(self.data_file_path, ".mccl")
+        col_indices = list(readIntsFromFile(col_indices_file_path))
+        col_names = readStringFromFile(col_names_file_path).split(b"\t")
 
-        # Get the coords for each column to select
-        select_column_coords = list(parse_data_coords(col_indices, cc_handle, mccl))
+        self.build_output_file_from_indices(row_indices, col_indices, col_names, out_file_path, out_file_type, num_processes)
 
-        # Write output file (in chunks)
-        with open(out_file_path, 'wb') as out_file:
-            # Header line
-            out_file.write(readStringFromFile(col_names_file_path) + b"\n")
+    # This function does the same as build_output_file, but the row indices, column
+    #   indices, and column names are passed in directly (for example, as returned by
+    #   find_sample_indices_matching_filters and find_column_indices_to_select).
+    #   The indices can be numpy arrays, lists, or other iterables of ints.
+    def build_output_file_from_indices(self, row_indices, col_indices, col_names, out_file_path, out_file_type, num_processes=1):
+        if out_file_type in COLUMNAR_OUTPUT_FILE_TYPES:
+            if isinstance(col_indices, np.ndarray):
+                col_indices = col_indices.tolist()
+            col_indices = list(col_indices)
 
-            out_lines = []
-            chunk_size = 1000
+            all_column_types = list(readStringsFromFile(self.data_file_path, ".ct"))
+            col_types = [all_column_types[i] for i in col_indices]
 
-            for row_index in row_indices:
-                out_lines.append(b"\t".join([x.rstrip() for x in parse_data_values(row_index, ll, select_column_coords, data_handle)]))
+            cc_handle = self.open_file(".cc")
+            col_widths = [coords[2] - coords[1] for coords in self.parse_column_coords(col_indices, cc_handle, self.read_int(".mccl"))]
+            self.close_file(cc_handle)
 
-                if len(out_lines) % chunk_size == 0:
-                    out_file.write(b"\n".join(out_lines) + b"\n")
-                    out_lines = []
+            row_indices = np.fromiter(row_indices, dtype=np.int64)
+            batches = self.iter_column_batches(row_indices, col_indices, col_types)
 
-            if len(out_lines) > 0:
-                out_file.write(b"\n".join(out_lines) + b"\n")
+            save_columnar_output(out_file_path, out_file_type, col_names, col_types, col_widths, len(row_indices), batches)
+            return
 
-        data_handle.close()
-        cc_handle.close()
+        with open(out_file_path, 'wb') as out_file:
+            for chunk in self.iter_output(row_indices, col_indices, col_names, out_file_type, num_processes=num_processes):
+                out_file.write(chunk)
+
+    # This function generates the output for the specified rows and columns in chunks
+    #   of (at least) chunk_size bytes, so it can be sent while the rest is extracted.
+    #   The header line is generated by itself first. The arguments are the same as for
+    #   build_output_file_from_indices.
+    # If num_processes is greater than 1, the rows are split into contiguous pieces of
+    #   task_bytes (or rows_per_task rows, if specified), which are extracted in parallel
+    #   (each process maps the data file itself), and the output is generated in the
+    #   original order. Only a few pieces per process are extracted ahead of the caller.
+    def iter_output(self, row_indices, col_indices, col_names, out_file_type="tsv", chunk_size=DEFAULT_OUTPUT_CHUNK_SIZE, num_processes=1, task_bytes=DEFAULT_OUTPUT_TASK_BYTES, rows_per_task=None):
+        if out_file_type != "tsv":
+            raise Exception("Only tsv output can be generated in chunks.")
+
+        if isinstance(row_indices, np.ndarray):
+            row_indices = row_indices.tolist()
+        if isinstance(col_indices, np.ndarray):
+            col_indices = col_indices.tolist()
+
+        # Header line
+        yield b"\t".join(col_names) + b"\n"
+
+        if num_processes <= 1:
+            yield from self.iter_output_rows(row_indices, col_indices, chunk_size)
+            return
+
+        row_indices = list(row_indices)
+        col_indices = list(col_indices)
+        if rows_per_task == None:
+            rows_per_task = max(1, task_bytes // self.read_int(".ll"))
+
+        if len(row_indices) <= rows_per_task:
+            yield from self.iter_output_rows(row_indices, col_indices, chunk_size)
+            return
+
+        args_iter = ((self.data_file_path, row_indices[i:(i + rows_per_task)], col_indices) for i in range(0, len(row_indices), rows_per_task))
+
+        with Pool(num_processes) as pool:
+            out_chunks = []
+            out_length = 0
+
+            for out_chunk in imap_bounded(pool, extract_output_rows, args_iter, num_processes * 2):
+                out_chunks.append(out_chunk)
+                out_length += len(out_chunk)
+
+                if out_length >= chunk_size:
+                    yield b"".join(out_chunks)
+                    out_chunks = []
+                    out_length = 0
+
+            if out_length > 0:
+                yield b"".join(out_chunks)
 
     # This is a convenience function, which acts as a wrapper around other functions.
-    def query(self, discrete_filters, numeric_filters, select_columns, select_groups, select_pathways, out_file_path, out_file_type="tsv"):
-        num_samples, row_indices_file_path = self.save_sample_indices_matching_filters(discrete_filters, numeric_filters)
-        num_columns, col_indices_file_path, col_names_file_path = self.save_column_indices_to_select(select_columns, select_groups, select_pathways)
+    def query(self, discrete_filters, numeric_filters, select_columns, select_groups, select_pathways, out_file_path, out_file_type="tsv", filter_expression=None, num_processes=1):
+        row_indices = self.find_sample_indices_matching_filters(discrete_filters, numeric_filters, filter_expression)
+        col_indices, col_names = self.find_column_indices_to_select(select_columns, select_groups, select_pathways)
 
-        self.build_output_file(row_indices_file_path, col_indices_file_path, col_names_file_path, out_file_path, out_file_type)
+        self.build_output_file_from_indices(row_indices, col_indices, col_names, out_file_path, out_file_type, num_processes)
 
-        if os.path.exists(row_indices_file_path):
-            os.remove(row_indices_file_path)
-        if os.path.exists(col_indices_file_path):
-            os.remove(col_indices_file_path)
+        return len(row_indices), len(col_indices)
 
-        return num_samples, num_columns
+    # This function does the same as query, but instead of saving the output to a file, it
+    #   generates the output in chunks of (at least) chunk_size bytes (see iter_output).
+    #   The rows are filtered before the first chunk is generated.
+    def iter_query(self, discrete_filters, numeric_filters, select_columns, select_groups, select_pathways, out_file_type="tsv", filter_expression=None, chunk_size=DEFAULT_OUTPUT_CHUNK_SIZE, num_processes=1):
+        row_indices = self.find_sample_indices_matching_filters(discrete_filters, numeric_filters, filter_expression)
+        col_indices, col_names = self.find_column_indices_to_select(select_columns, select_groups, select_pathways)
+
+        return self.iter_output(row_indices, col_indices, col_names, out_file_type, chunk_size, num_processes)
 
     # This function returns a dictionary where each key is a group name and
     #   each value is a list of tuples. Each tuple will indicate the index of
@@ -245,12 +435,19 @@ class DataSetParser:
     # This function returns metadata for a given variable. If it is a numeric
     #   variable, it returns the min and max values. If it is a discrete
     #   variable, it returns the list of options (or None if there are too many).
-    def get_variable_meta(self, column_index, max_discrete_options=100):
+    # For a numeric variable, quantiles can be a list of fractions (for example,
+    #   [0.25, 0.5, 0.75]). The values at those quantiles are then also returned
+    #   (or None if the data file has no numeric matrix).
+    def get_variable_meta(self, column_index, max_discrete_options=100, quantiles=None):
         description_raw = self.get_variable_description(column_index)
         description_parts = description_raw.split("|")
 
         if len(description_parts) == 1: # It is a numeric variable
             min_max = [float(x) for x in description_parts[0].split(",")]
+
+            if quantiles != None:
+                return min_max[0], min_max[1], self.find_quantiles(column_index, quantiles)
+
             return min_max[0], min_max[1]
 
         if description_parts[1] == "ID":
@@ -282,6 +479,13 @@ class DataSetParser:
 
         return list(islice(matches, max_discrete_options))
 
+    # This function returns the values of a numeric column as a NumPy array of floats
+    #   (NaN for missing values), or None if the column is not numeric or the data file
+    #   does not have a numeric matrix. If row_indices (a list) is specified, only
+    #   the values for those rows are returned.
+    def get_numeric_values(self, column_index, row_indices=None):
+        return self.get_column_matrix_values(".nm", ".nmc", column_index, row_indices)
+
     # For now, this function is a bit of a hack (for lack of a better idea).
     #   It looks through the temp directory and deletes any file that is older
     #   than 15 minutes. It returns the number of files that were deleted.
@@ -304,22 +508,380 @@ class DataSetParser:
     # Treat these as private functions.
     ########################################################################
 
+    # Generates the tsv lines (without the header) for the specified rows and columns
+    #   in chunks of (at least) chunk_size bytes.
+    def iter_output_rows(self, row_indices, col_indices, chunk_size=DEFAULT_OUTPUT_CHUNK_SIZE):
+        # Prepare to parse data
+        data_handle = self.open_file()
+        ll = self.read_int(".ll")
+        cc_handle = self.open_file(".cc")
+        mccl = self.read_int(".mccl")
+
+        # The files are closed even if the caller stops before the end.
+        try:
+            # Get the coords for each column to select
+            select_column_coords = self.parse_column_coords(col_indices, cc_handle, mccl)
+            extraction_plan = compile_extraction_plan(select_column_coords)
+
+            out_lines = []
+            out_length = 0
+
+            for row_index in row_indices:
+                if extraction_plan == None:
+                    out_line = b"\t".join([x.rstrip() for x in parse_data_values(row_index, ll, select_column_coords, data_handle)])
+                else:
+                    out_line = b"\t".join(map(bytes.rstrip, parse_row_values(row_index, ll, extraction_plan, data_handle)))
+
+                out_lines.append(out_line)
+                out_length += len(out_line) + 1
+
+                if out_length >= chunk_size:
+                    yield b"\n".join(out_lines) + b"\n"
+                    out_lines = []
+                    out_length = 0
+
+            if len(out_lines) > 0:
+                yield b"\n".join(out_lines) + b"\n"
+        finally:
+            self.close_file(data_handle)
+            self.close_file(cc_handle)
+
+    # Generates the values for the specified rows and columns in batches of rows. Each
+    #   batch is a list with an array for each column: floats for numeric columns (b"n"
+    #   in col_types), with NaN for missing values, and bytes (right-stripped) otherwise.
+    #   Numeric values come from the numeric matrix when the dataset has one. Each batch
+    #   reads about batch_bytes from the data file: only the selected columns if the file
+    #   is memory mapped, or whole rows if it is compressed.
+    def iter_column_batches(self, row_indices, col_indices, col_types, batch_bytes=DEFAULT_OUTPUT_BATCH_BYTES):
+        data_handle = self.open_file()
+        ll = self.read_int(".ll")
+        cc_handle = self.open_file(".cc")
+        select_column_coords = self.parse_column_coords(col_indices, cc_handle, self.read_int(".mccl"))
+        self.close_file(cc_handle)
+
+        rows = None
+        if isinstance(data_handle, mmap.mmap):
+            rows = np.frombuffer(data_handle, dtype=np.uint8, count=self.num_samples * ll).reshape(self.num_samples, ll)
+            batch_rows = max(1, batch_bytes // max(1, sum([coords[2] - coords[1] for coords in select_column_coords])))
+        else:
+            batch_rows = max(1, batch_bytes // ll)
+
+        # The files are closed even if the caller stops before the end.
+        try:
+            for start in range(0, len(row_indices), batch_rows):
+                batch_row_indices = row_indices[start:(start + batch_rows)]
+
+                if rows is None:
+                    batch_rows_bytes = b"".join([data_handle[(i * ll):((i + 1) * ll)] for i in batch_row_indices.tolist()])
+                    batch = np.frombuffer(batch_rows_bytes, dtype=np.uint8).reshape(len(batch_row_indices), ll)
+
+                batch_values = []
+                for col_index, coords, col_type in zip(col_indices, select_column_coords, col_types):
+                    if col_type == b"n":
+                        values = self.get_numeric_values(col_index, batch_row_indices)
+
+                        if values is not None:
+                            batch_values.append(values)
+                            continue
+
+                    if rows is None:
+                        value_bytes = batch[:, coords[1]:coords[2]]
+                    else:
+                        value_bytes = rows[batch_row_indices, coords[1]:coords[2]]
+
+                    if col_type == b"n":
+                        batch_values.append(parse_numeric_array(value_bytes))
+                    elif coords[2] == coords[1]:
+                        batch_values.append(np.full(len(batch_row_indices), b""))
+                    else:
+                        batch_values.append(np.char.rstrip(np.ascontiguousarray(value_bytes).view("S{}".format(coords[2] - coords[1])).ravel()))
+
+                yield batch_values
+        finally:
+            # The file cannot be closed while the array refers to it.
+            del rows
+            self.close_file(data_handle)
+
+    # Returns the number of files this parser has open and the number of bytes they map.
+    #   Decompressed blocks in the block cache are counted as mapped bytes.
+    def count_open_files(self):
+        with self.__lock:
+            handles = [] if self.__open_handles == None else list(self.__open_handles.values())
+            if self.__postings != None:
+                handles.append(self.__postings[0])
+
+            num_files = len(handles)
+            num_bytes = sum([len(handle) for handle in handles if isinstance(handle, mmap.mmap)]) + self.__block_cache.num_bytes
+
+            for matrix, column_indices in self.__column_matrices.values():
+                num_files += 1
+                num_bytes += matrix.nbytes
+
+        return num_files, num_bytes
+
+    # Returns a boolean array that indicates which of the specified rows (or all rows if
+    #   row_indices is None) match the filter. The values are taken from the discrete codes
+    #   if possible. Otherwise, they are taken from rows, a (num_rows, ll) array view of
+    #   the data file. If rows is None, this returns None.
+    def find_discrete_matches(self, the_filter, row_indices=None, rows=None, cc_handle=None, mccl=None):
+        posting_row_indices = self.find_posting_row_indices(the_filter)
+
+        if posting_row_indices is not None:
+            matches = np.zeros(self.num_samples, dtype=bool)
+            matches[posting_row_indices] = True
+
+            return matches if row_indices is None else matches[row_indices]
+
+        codes = self.get_column_matrix_values(".dcm", ".dcc", the_filter.column_index, row_indices)
+
+        if codes is not None:
+            categories = parse_discrete_categories(self.get_variable_description(the_filter.column_index).encode())
+            return np.isin(codes, [code for code, category in enumerate(categories) if category in the_filter.values_set])
+
+        if rows is None:
+            return None
+
+        coords = self.parse_column_coords([the_filter.column_index], cc_handle, mccl)[0]
+        value_bytes = rows[:, coords[1]:coords[2]] if row_indices is None else rows[row_indices, coords[1]:coords[2]]
+
+        # Every value is missing in a column with no width.
+        if coords[2] == coords[1]:
+            values = np.full(len(value_bytes), b"")
+        else:
+            values = np.char.rstrip(np.ascontiguousarray(value_bytes).view("S{}".format(coords[2] - coords[1])).ravel())
+
+        return np.isin(values, list(the_filter.values_set))
+
+    # Returns the indices of the rows that match the filter from the inverted index
+    #   (without reading the data), or None if there is no inverted index for the column.
+    def find_posting_row_indices(self, the_filter):
+        offsets, slot = self.get_column_slot(".dho", ".dcc", the_filter.column_index)
+
+        if offsets is None or not os.path.exists(self.data_file_path + ".dpo"):
+            return None
+
+        with self.__lock:
+            if self.__postings == None:
+                self.__postings = (openReadFile(self.data_file_path, ".dp"), np.load(self.data_file_path + ".dpo"))
+            dp_handle, posting_offsets = self.__postings
+
+        categories = parse_discrete_categories(self.get_variable_description(the_filter.column_index).encode())
+        posting_row_indices = [np.zeros(0, dtype=np.int64)]
+
+        for code, category in enumerate(categories):
+            if category in the_filter.values_set:
+                list_index = offsets[slot] + code
+                posting_list = zlib.decompress(dp_handle[posting_offsets[list_index]:posting_offsets[list_index + 1]])
+                posting_row_indices.append(np.cumsum(np.frombuffer(posting_list, dtype=np.uint32), dtype=np.int64))
+
+        return np.concatenate(posting_row_indices)
+
+    # Like find_discrete_matches, but uses the numeric matrix. Missing values never match.
+    def find_numeric_matches(self, the_filter, operator_dict, row_indices=None, rows=None, cc_handle=None, mccl=None):
+        if the_filter.operator not in operator_dict:
+            raise Exception("Invalid operator: " + the_filter.operator)
+
+        # The sorted index is only faster when few rows match.
+        sorted_row_indices = self.find_sorted_row_indices(the_filter, max_matches=self.num_samples // 10)
+
+        if sorted_row_indices is not None:
+            matches = np.zeros(self.num_samples, dtype=bool)
+            matches[sorted_row_indices] = True
+
+            return matches if row_indices is None else matches[row_indices]
+
+        # Skip blocks of rows whose values cannot match.
+        candidate_blocks = self.find_candidate_blocks(the_filter)
+
+        if candidate_blocks is not None and not candidate_blocks[0].all():
+            candidate_blocks, rows_per_block = candidate_blocks
+
+            if row_indices is None:
+                candidate_row_indices = [np.arange(block_index * rows_per_block, min([(block_index + 1) * rows_per_block, self.num_samples])) for block_index in np.flatnonzero(candidate_blocks).tolist()]
+                candidate_row_indices = np.concatenate([np.zeros(0, dtype=np.int64)] + candidate_row_indices)
+                matches = np.zeros(self.num_samples, dtype=bool)
+            else:
+                row_indices = np.asarray(row_indices)
+                in_candidate_block = candidate_blocks[row_indices // rows_per_block]
+                candidate_row_indices = row_indices[in_candidate_block]
+                matches = np.zeros(len(row_indices), dtype=bool)
+
+            if len(candidate_row_indices) > 0:
+                candidate_matches = self.compare_numeric_values(the_filter, operator_dict, candidate_row_indices, rows, cc_handle, mccl)
+                if candidate_matches is None:
+                    return None
+
+                if row_indices is None:
+                    matches[candidate_row_indices] = candidate_matches
+                else:
+                    matches[in_candidate_block] = candidate_matches
+
+            return matches
+
+        return self.compare_numeric_values(the_filter, operator_dict, row_indices, rows, cc_handle, mccl)
+
+    # Compares the values for the specified rows (or all rows) with a numeric filter,
+    #   taking the values from the numeric matrix if possible or otherwise from rows.
+    def compare_numeric_values(self, the_filter, operator_dict, row_indices=None, rows=None, cc_handle=None, mccl=None):
+        numeric_values = self.get_numeric_values(the_filter.column_index, row_indices)
+
+        if numeric_values is None:
+            if rows is None:
+                return None
+
+            coords = self.parse_column_coords([the_filter.column_index], cc_handle, mccl)[0]
+            numeric_values = parse_numeric_array(rows[:, coords[1]:coords[2]] if row_indices is None else rows[row_indices, coords[1]:coords[2]])
+
+        # Comparisons with NaN (missing) are False, except for !=.
+        return operator_dict[the_filter.operator](numeric_values, the_filter.query_value) & ~np.isnan(numeric_values)
+
+    # Returns a boolean array that indicates which rows match a filter expression. Each
+    #   DiscreteFilter and NumericFilter is evaluated once for all rows. An AndFilter
+    #   stops once no rows match, and an OrFilter stops once all rows match.
+    def find_expression_matches(self, expression, num_rows, operator_dict, data_handle, rows, cc_handle, mccl, ll):
+        if isinstance(expression, AndFilter):
+            matches = np.ones(num_rows, dtype=bool)
+
+            for the_filter in expression.filters:
+                if not matches.any():
+                    break
+                matches &= self.find_expression_matches(the_filter, num_rows, operator_dict, data_handle, rows, cc_handle, mccl, ll)
+
+            return matches
+
+        if isinstance(expression, OrFilter):
+            matches = np.zeros(num_rows, dtype=bool)
+
+            for the_filter in expression.filters:
+                if matches.all():
+                    break
+                matches |= self.find_expression_matches(the_filter, num_rows, operator_dict, data_handle, rows, cc_handle, mccl, ll)
+
+            return matches
+
+        if isinstance(expression, NotFilter):
+            return ~self.find_expression_matches(expression.filter, num_rows, operator_dict, data_handle, rows, cc_handle, mccl, ll)
+
+        if isinstance(expression, DiscreteFilter):
+            matches = self.find_discrete_matches(expression, None, rows, cc_handle, mccl)
+            if matches is None:
+                matches = np.zeros(num_rows, dtype=bool)
+                matches[list(self.filter_rows_discrete(range(num_rows), expression, data_handle, cc_handle, mccl, ll))] = True
+
+            return matches
+
+        if isinstance(expression, NumericFilter):
+            matches = self.find_numeric_matches(expression, operator_dict, None, rows, cc_handle, mccl)
+            if matches is None:
+                matches = np.zeros(num_rows, dtype=bool)
+                matches[list(self.filter_rows_numeric(range(num_rows), expression, operator_dict, data_handle, cc_handle, mccl, ll))] = True
+
+            return matches
+
+        raise Exception("Invalid filter: {}".format(expression))
+
+    # Returns a boolean array that indicates which blocks of rows might have values that
+    #   match a numeric filter (see save_numeric_zone_maps), and the number of rows per
+    #   block. Returns None if there are no zone maps for the column.
+    def find_candidate_blocks(self, the_filter):
+        zone_maps = self.get_column_matrix_values(".nzm", ".nmc", the_filter.column_index)
+
+        if zone_maps is None:
+            return None
+
+        min_values = zone_maps[:, 0]
+        max_values = zone_maps[:, 1]
+        query_value = the_filter.query_value
+
+        # Comparisons with NaN (blocks with only missing values) are False.
+        if the_filter.operator == "==":
+            candidate_blocks = (min_values <= query_value) & (max_values >= query_value)
+        elif the_filter.operator == "!=":
+            candidate_blocks = ~np.isnan(min_values) & ((min_values != query_value) | (max_values != query_value))
+        elif the_filter.operator in (">", ">="):
+            candidate_blocks = {">": operator.gt, ">=": operator.ge}[the_filter.operator](max_values, query_value)
+        else:
+            candidate_blocks = {"<": operator.lt, "<=": operator.le}[the_filter.operator](min_values, query_value)
+
+        return candidate_blocks, self.read_int(".nzb")
+
+    # Returns the indices of the rows that match a numeric filter from the sorted index
+    #   (see save_sorted_numeric_index), or None if there is no sorted index for the column
+    #   or if more than max_matches rows match.
+    def find_sorted_row_indices(self, the_filter, max_matches=None):
+        sorted_values = self.get_column_matrix_values(".nsv", ".nmc", the_filter.column_index)
+
+        if sorted_values is None:
+            return None
+
+        sorted_row_indices = self.get_column_matrix_values(".nsr", ".nmc", the_filter.column_index)
+
+        # Missing values (NaN) are at the end.
+        num_values = int(np.searchsorted(sorted_values, np.inf, side="right"))
+        left = int(np.searchsorted(sorted_values[:num_values], the_filter.query_value, side="left"))
+        right = int(np.searchsorted(sorted_values[:num_values], the_filter.query_value, side="right"))
+
+        ranges = {">": [(right, num_values)], ">=": [(left, num_values)], "<": [(0, left)], "<=": [(0, right)], "==": [(left, right)], "!=": [(0, left), (right, num_values)]}[the_filter.operator]
+
+        if max_matches != None and sum([end - start for start, end in ranges]) > max_matches:
+            return None
+
+        return np.concatenate([sorted_row_indices[start:end] for start, end in ranges]).astype(np.int64)
+
+    # Uses the sorted index if there is one. Otherwise, sorts the values in the numeric matrix.
+    def find_quantiles(self, column_index, quantiles):
+        sorted_values = self.get_column_matrix_values(".nsv", ".nmc", column_index)
+
+        if sorted_values is None:
+            numeric_values = self.get_numeric_values(column_index)
+            if numeric_values is None:
+                return None
+
+            sorted_values = np.sort(numeric_values)
+
+        num_values = int(np.searchsorted(sorted_values, np.inf, side="right"))
+        if num_values == 0:
+            return None
+
+        # Interpolate between the closest values (like np.quantile).
+        positions = np.array(quantiles, dtype=np.float64) * (num_values - 1)
+        lower = np.floor(positions).astype(np.int64)
+        upper = np.ceil(positions).astype(np.int64)
+
+        return (sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (positions - lower)).tolist()
+
+    # The filter_rows functions are used when the data file is compressed (and cannot be viewed as an array).
     def filter_rows_discrete(self, row_indices, the_filter, data_handle, cc_handle, mccl, ll):
-        query_col_coords = list(parse_data_coords([the_filter.column_index], cc_handle, mccl))
+        matches = self.find_discrete_matches(the_filter)
+
+        if matches is not None:
+            for row_index in row_indices:
+                if matches[row_index]:
+                    yield row_index
+
+            return
+
+        query_col_coords = self.parse_column_coords([the_filter.column_index], cc_handle, mccl)
 
         for row_index in row_indices:
             if next(parse_data_values(row_index, ll, query_col_coords, data_handle)).rstrip() in the_filter.values_set:
                 yield row_index
 
     def filter_rows_numeric(self, row_indices, the_filter, operator_dict, data_handle, cc_handle, mccl, ll):
-        if the_filter.operator not in operator_dict:
-            raise Exception("Invalid operator: " + oper)
+        matches = self.find_numeric_matches(the_filter, operator_dict)
+
+        if matches is not None:
+            for row_index in row_indices:
+                if matches[row_index]:
+                    yield row_index
+
+            return
 
-        query_col_coords = list(parse_data_coords([the_filter.column_index], cc_handle, mccl))
+        query_col_coords = self.parse_column_coords([the_filter.column_index], cc_handle, mccl)
 
         for row_index in row_indices:
             value = next(parse_data_values(row_index, ll, query_col_coords, data_handle)).rstrip()
-            if value == b"": # Is missing
+            if value == b"" or value == b"NA": # Is missing
                 continue
 
             # See https://stackoverflow.com/questions/18591778/how-to-pass-an-operator-to-a-python-function
@@ -327,25 +889,29 @@ class DataSetParser:
                 yield row_index
 
     def search_id(self, column_index, search_str=None):
-        data_handle = openReadFile(self.data_file_path)
-        ll = readIntFromFile(self.data_file_path, ".ll")
-        cc_handle = openReadFile(self.data_file_path, ".cc")
-        mccl = readIntFromFile(self.data_file_path, ".mccl")
+        data_handle = self.open_file()
+        ll = self.read_int(".ll")
+        cc_handle = self.open_file(".cc")
+        mccl = self.read_int(".mccl")
         num_rows = self.num_samples
 
-        col_coords = list(parse_data_coords([column_index], cc_handle, mccl))
+        col_coords = self.parse_column_coords([column_index], cc_handle, mccl)
+
+        # Discrete columns with too many options to list are also searched here
+        #   (see ColumnSummary.get_description), so each value is only returned once.
+        found_values = set()
 
         for row_index in range(num_rows):
             value = next(parse_data_values(row_index, ll, col_coords, data_handle)).rstrip().decode()
 
-            if search_str:
-                if search_str in value:
-                    yield value
-            else:
-                yield value
+            if value in found_values or (search_str and search_str not in value):
+                continue
+
+            found_values.add(value)
+            yield value
 
-        data_handle.close()
-        cc_handle.close()
+        self.close_file(data_handle)
+        self.close_file(cc_handle)
 
     def parse_values_for_group(self, file_extension, group_name, search_str, max_num):
         values = []
@@ -391,11 +957,167 @@ class DataSetParser:
 
         return indices
 
+    # Returns the values for a column from a matrix created by save_column_matrix(),
+    #   or None if the matrix does not exist or does not include the column.
+    def get_column_matrix_values(self, matrix_file_extension, indices_file_extension, column_index, row_indices=None):
+        matrix, slot = self.get_column_slot(matrix_file_extension, indices_file_extension, column_index)
+
+        if matrix is None:
+            return None
+
+        if row_indices is None:
+            return matrix[slot]
+
+        return matrix[slot, row_indices]
+
+    # Returns a matrix (loaded once) and the position of the column in the matrix,
+    #   or None for both if the matrix does not exist or does not include the column.
+    def get_column_slot(self, matrix_file_extension, indices_file_extension, column_index):
+        with self.__lock:
+            if matrix_file_extension not in self.__column_matrices:
+                if not os.path.exists(self.data_file_path + matrix_file_extension):
+                    return None, None
+
+                matrix = np.load(self.data_file_path + matrix_file_extension, mmap_mode="r")
+                self.__column_matrices[matrix_file_extension] = (matrix, np.load(self.data_file_path + indices_file_extension))
+
+            matrix, column_indices = self.__column_matrices[matrix_file_extension]
+
+        slot = np.searchsorted(column_indices, column_index)
+        if slot == len(column_indices) or column_indices[slot] != column_index:
+            return None, None
+
+        return matrix, slot
+
+    # Returns the filters in the order they will be applied (the most selective first).
+    #   Each item is a tuple with the estimated fraction of rows that match the filter,
+    #   how this was estimated ("histogram", "description", or "unknown"), and the filter.
+    def plan_filters(self, discrete_filters, numeric_filters, operator_dict):
+        plan = []
+
+        for df in discrete_filters:
+            plan.append(self.estimate_discrete_selectivity(df) + (df,))
+        for nf in numeric_filters:
+            plan.append(self.estimate_numeric_selectivity(nf, operator_dict) + (nf,))
+
+        return sorted(plan, key=lambda x: x[0])
+
+    def estimate_discrete_selectivity(self, the_filter):
+        description = self.get_variable_description(the_filter.column_index)
+        categories = parse_discrete_categories(description.encode())
+
+        if categories != None:
+            codes = [code for code, category in enumerate(categories) if category in the_filter.values_set]
+
+            offsets, slot = self.get_column_slot(".dho", ".dcc", the_filter.column_index)
+            if offsets is not None:
+                counts = np.load(self.data_file_path + ".dh", mmap_mode="r")[offsets[slot]:offsets[slot + 1]]
+                return int(counts[codes].sum()) / max([1, self.num_samples]), "histogram"
+
+            return len([code for code in codes if code > 1]) / max([1, len(categories) - 2]), "description"
+
+        description_parts = description.split("|")
+        if len(description_parts) == 2 and description_parts[0].isdigit():
+            return min([1.0, len(the_filter.values_set) / max([1, int(description_parts[0])])]), "description"
+
+        return 1.0, "unknown"
+
+    # Assumes that values are spread evenly within the column's range (or within each
+    #   bin of its histogram, if there is one).
+    def estimate_numeric_selectivity(self, the_filter, operator_dict):
+        description_parts = self.get_variable_description(the_filter.column_index).split("|")
+        if len(description_parts) != 1 or the_filter.operator not in operator_dict:
+            return 1.0, "unknown"
+
+        min_value, max_value = [float(x) for x in description_parts[0].split(",")]
+        num_rows = max([1, self.num_samples])
+
+        counts = self.get_column_matrix_values(".nh", ".nmc", the_filter.column_index)
+        if counts is None:
+            counts = np.array([num_rows])
+            source = "description"
+        else:
+            source = "histogram"
+
+        edges = np.linspace(min_value, max_value, len(counts) + 1).tolist()
+        query_value = the_filter.query_value
+        num_matches = 0.0
+
+        for count, low, high in zip(counts.tolist(), edges[:-1], edges[1:]):
+            if the_filter.operator in ("==", "!="):
+                # Assume the values in a bin are all different.
+                num_equal = 1.0 if count > 0 and low <= query_value <= high else 0.0
+                num_matches += num_equal if the_filter.operator == "==" else count - num_equal
+            elif high == low:
+                num_matches += count if operator_dict[the_filter.operator](low, query_value) else 0
+            elif the_filter.operator in (">", ">="):
+                num_matches += count * min([1.0, max([0.0, (high - query_value) / (high - low)])])
+            else:
+                num_matches += count * min([1.0, max([0.0, (query_value - low) / (high - low)])])
+
+        return min([1.0, num_matches / num_rows]), source
+
+    # Opens a file for this dataset ("" is the data file), or returns the file that is
+    #   already open if the parser is being used as a context manager.
+    def open_file(self, file_extension=""):
+        with self.__lock:
+            if self.__open_handles != None and file_extension in self.__open_handles:
+                return self.__open_handles[file_extension]
+
+            handle = self.open_data_file() if file_extension == "" else openReadFile(self.data_file_path, file_extension)
+
+            if self.__open_handles != None:
+                self.__open_handles[file_extension] = handle
+
+            return handle
+
+    # Closes a file opened with open_file, unless it is being kept open.
+    def close_file(self, handle):
+        with self.__lock:
+            if self.__open_handles != None and handle in self.__open_handles.values():
+                return
+
+        handle.close()
+
+    def read_int(self, file_extension):
+        with self.__lock:
+            if self.__cached_ints == None:
+                return readIntFromFile(self.data_file_path, file_extension)
+
+            if file_extension not in self.__cached_ints:
+                self.__cached_ints[file_extension] = readIntFromFile(self.data_file_path, file_extension)
+
+            return self.__cached_ints[file_extension]
+
+    # Returns the coordinates of each column as [index, start position, end position],
+    #   like parse_data_coords. If the parser is being used as a context manager, the
+    #   start position of every column is read once and kept in memory.
+    def parse_column_coords(self, column_indices, cc_handle, mccl):
+        with self.__lock:
+            if self.__open_handles == None:
+                column_starts = None
+            else:
+                if self.__column_starts == None:
+                    self.__column_starts = np.char.strip(np.frombuffer(cc_handle[:], dtype="S{}".format(mccl + 1))).astype(np.int64).tolist()
+                column_starts = self.__column_starts
+
+        if column_starts == None:
+            return list(parse_data_coords(column_indices, cc_handle, mccl))
+
+        return [[index, column_starts[index], column_starts[index + 1]] for index in column_indices]
+
+    # The data file is read from its compressed blocks if the uncompressed file is not present.
+    def open_data_file(self):
+        if os.path.exists(self.data_file_path):
+            return openReadFile(self.data_file_path)
+
+        return CompressedFwfFile(self.data_file_path, self.__block_cache)
+
     def get_variable_description(self, column_index):
-        cd_handle = openReadFile(self.data_file_path, ".cd")
-        mcdl = readIntFromFile(self.data_file_path, ".mcdl")
+        cd_handle = self.open_file(".cd")
+        mcdl = self.read_int(".mcdl")
         description = next(parse_data_values(column_index, mcdl + 1, [[0, 0, mcdl]], cd_handle)).rstrip().decode()
-        cd_handle.close()
+        self.close_file(cd_handle)
 
         return description
 
@@ -429,3 +1151,59 @@ class DataSetParser:
                 return
             yield source[start:idx]
             start = idx + sepsize
+
+# Returns a parser for the specified dataset that keeps its files open (see
+#   DataSetParser.__enter__). The same parser is returned on later calls until the
+#   dataset's .timestamp changes (for example, when build_geney_files rebuilds it).
+# Parsers that are no longer kept (because they were replaced or were the least recently
+#   used when too many files were open) are not closed explicitly, because they might
+#   still be in use. Their files are closed when they are garbage collected.
+def get_parser(data_file_path, max_open_files=MAX_OPEN_PARSER_FILES, max_open_bytes=MAX_OPEN_PARSER_BYTES):
+    timestamp = None
+    if os.path.exists(data_file_path + ".timestamp"):
+        timestamp = readStringFromFile(data_file_path, ".timestamp")
+
+    with open_parsers_lock:
+        if data_file_path in open_parsers:
+            parser, parser_timestamp = open_parsers.pop(data_file_path)
+
+            if parser_timestamp != timestamp:
+                parser = DataSetParser(data_file_path).__enter__()
+        else:
+            parser = DataSetParser(data_file_path).__enter__()
+
+        # Evict the least recently used parsers (but not this one).
+        open_counts = [open_parser.count_open_files() for open_parser, parser_timestamp in open_parsers.values()]
+        num_files = sum([x[0] for x in open_counts]) + parser.count_open_files()[0]
+        num_bytes = sum([x[1] for x in open_counts]) + parser.count_open_files()[1]
+
+        for evict_path, (evict_num_files, evict_num_bytes) in zip(list(open_parsers.keys()), open_counts):
+            if num_files <= max_open_files and num_bytes <= max_open_bytes:
+                break
+
+            del open_parsers[evict_path]
+            num_files -= evict_num_files
+            num_bytes -= evict_num_bytes
+
+        open_parsers[data_file_path] = (parser, timestamp)
+
+    return parser
+
+# Extracts the tsv lines for some of the rows in a separate process (see DataSetParser.iter_output).
+def extract_output_rows(data_file_path, row_indices, col_indices):
+    return b"".join(DataSetParser(data_file_path).iter_output_rows(row_indices, col_indices))
+
+# Calls the function in the pool once for each tuple of arguments and generates the
+#   results in order. Like apply_in_processes (DataSetBuilder.py), at most max_pending
+#   calls are queued at a time, so results are not piled up when the caller is slow.
+def imap_bounded(pool, function, args_iter, max_pending):
+    pending_results = []
+
+    for args in args_iter:
+        pending_results.append(pool.apply_async(function, args))
+
+        if len(pending_results) >= max_pending:
+            yield pending_results.pop(0).get()
+
+    for result in pending_results:
+        yield result.get()
@@ -4,3 +4,6 @@ class DiscreteFilter:
     def __init__(self, column_index, values_list):
         self.column_index = column_index
         self.values_set = set([x.encode() for x in values_list])
+
+    def __repr__(self):
+        return "DiscreteFilter({}, {})".format(self.column_index, sorted([x.decode() for x in self.values_set]))
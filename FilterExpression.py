@@ -0,0 +1,19 @@
+# These classes combine filters (DiscreteFilter, NumericFilter, or other expressions)
+#   into a filter expression. DataSetParser evaluates an expression as a bitmap (one
+#   boolean per row), so each filter reads its column only once. For example:
+#     OrFilter([DiscreteFilter(3, ["Med"]), NotFilter(NumericFilter(1, ">", 2))])
+# Missing values never match a NumericFilter, so they do match NotFilter(NumericFilter(...)).
+
+class AndFilter:
+    # Input the filters as a list.
+    def __init__(self, filters):
+        self.filters = filters
+
+class OrFilter:
+    # Input the filters as a list.
+    def __init__(self, filters):
+        self.filters = filters
+
+class NotFilter:
+    def __init__(self, the_filter):
+        self.filter = the_filter
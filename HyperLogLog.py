@@ -0,0 +1,48 @@
+import hashlib
+import math
+
+# This class estimates the number of unique values it has seen (the cardinality)
+#   using a fixed amount of memory (2 ** precision bytes). The relative error of the
+#   estimate is about 1.04 / sqrt(2 ** precision). See Flajolet et al. (2007),
+#   "HyperLogLog: the analysis of a near-optimal cardinality estimation algorithm."
+# Values are hashed with blake2b rather than hash() so that sketches built in
+#   different processes can be merged.
+class HyperLogLog:
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.num_registers = 2 ** precision
+        self.registers = bytearray(self.num_registers)
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(self.num_registers)
+
+    # Input the values as an iterable of bytes objects.
+    def add_values(self, values):
+        index_shift = 64 - self.precision
+        remainder_mask = (1 << index_shift) - 1
+
+        for value in values:
+            hashed = int.from_bytes(hashlib.blake2b(value, digest_size=8).digest(), "big")
+            register_index = hashed >> index_shift
+            rank = index_shift - (hashed & remainder_mask).bit_length() + 1
+
+            if rank > self.registers[register_index]:
+                self.registers[register_index] = rank
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise Exception("Cannot merge sketches with different precisions ({} and {}).".format(self.precision, other.precision))
+
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def estimate(self):
+        alpha = 0.7213 / (1 + 1.079 / self.num_registers)
+        raw_estimate = alpha * self.num_registers ** 2 / sum([2.0 ** -x for x in self.registers])
+
+        # Use linear counting for small cardinalities
+        num_zero_registers = self.registers.count(0)
+        if raw_estimate <= 2.5 * self.num_registers and num_zero_registers > 0:
+            return int(round(self.num_registers * math.log(self.num_registers / num_zero_registers)))
+
+        return int(round(raw_estimate))
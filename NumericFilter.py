@@ -6,3 +6,6 @@ class NumericFilter:
         self.column_index = column_index
         self.operator = operator
         self.query_value = query_value
+
+    def __repr__(self):
+        return "NumericFilter({}, {!r}, {})".format(self.column_index, self.operator, self.query_value)
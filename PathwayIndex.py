@@ -0,0 +1,155 @@
+import gzip
+import os
+import shutil
+import tempfile
+from DataSetHelper import *
+
+DEFAULT_GMT_FILE_URL = "https://www.pathwaycommons.org/archives/PC2/v11/PathwayCommons11.All.hgnc.gmt.gz"
+# Set this environment variable to use a local copy of the GMT file (no download is necessary)
+DEFAULT_GMT_FILE_PATH = os.environ.get("PATHWAY_GMT_FILE_PATH", "/tmp/{}".format(os.path.basename(DEFAULT_GMT_FILE_URL)))
+
+# Indices that have been loaded in this process (keyed by GMT file path)
+loaded_pathway_indices = {}
+
+# This class provides access to a pre-parsed index of the pathways in a GMT file.
+#   The index is stored in a directory next to the GMT file and has these files:
+#     index.pn - the pathway names (fixed width; the line number is the pathway ID)
+#     index.gn - the gene names, sorted (fixed width)
+#     index.gp - the IDs of the pathways for each gene (comma separated, one gene after another)
+#     index.gpc - the coordinates of each gene's pathway IDs in index.gp (fixed width)
+#   The files are memory mapped, so processes that use the same index share its pages.
+class PathwayIndex:
+    def __init__(self, index_dir_path):
+        self.index_file_path = os.path.join(index_dir_path, "index")
+        self.num_genes = readIntFromFile(self.index_file_path, ".ngene")
+
+        if self.num_genes > 0:
+            self.pn_handle = openReadFile(self.index_file_path, ".pn")
+            self.mpnl = readIntFromFile(self.index_file_path, ".mpnl")
+            self.gn_handle = openReadFile(self.index_file_path, ".gn")
+            self.mgnl = readIntFromFile(self.index_file_path, ".mgnl")
+            self.gp_handle = openReadFile(self.index_file_path, ".gp")
+            self.gpc_handle = openReadFile(self.index_file_path, ".gpc")
+            self.mgpcl = readIntFromFile(self.index_file_path, ".mgpcl")
+
+    # Returns a list of the names of the pathways that contain the specified gene.
+    def get_pathways(self, gene):
+        gene_index = self.find_gene_index(gene)
+        if gene_index == None:
+            return []
+
+        coords = next(parse_data_coords([gene_index], self.gpc_handle, self.mgpcl))
+        pathway_ids = self.gp_handle[coords[1]:coords[2]].split(b",")
+
+        return [parse_meta_value(self.pn_handle, self.mpnl, int(x)).rstrip() for x in pathway_ids]
+
+    ########################################################################
+    # Treat these as private functions.
+    ########################################################################
+
+    # Binary search of the sorted gene names
+    def find_gene_index(self, gene):
+        low = 0
+        high = self.num_genes - 1
+
+        while low <= high:
+            middle = (low + high) // 2
+            middle_gene = parse_meta_value(self.gn_handle, self.mgnl, middle).rstrip()
+
+            if middle_gene == gene:
+                return middle
+            if middle_gene < gene:
+                low = middle + 1
+            else:
+                high = middle - 1
+
+        return None
+
+# Returns the pathway index for the specified GMT file. The GMT file is downloaded if it
+#   does not exist, and the index is built if it does not exist or is older than the GMT file.
+#   After that, the index is loaded once per process.
+def get_pathway_index(gmt_file_path=DEFAULT_GMT_FILE_PATH, gmt_file_url=DEFAULT_GMT_FILE_URL):
+    if gmt_file_path in loaded_pathway_indices:
+        return loaded_pathway_indices[gmt_file_path]
+
+    if not os.path.exists(gmt_file_path):
+        if os.system("wget -O {} {}".format(gmt_file_path, gmt_file_url)) != 0:
+            # Remove the partial download so we try again next time
+            if os.path.exists(gmt_file_path):
+                os.remove(gmt_file_path)
+
+            raise Exception("Could not download {} to {}.".format(gmt_file_url, gmt_file_path))
+
+    index_dir_path = gmt_file_path + ".index"
+    if not os.path.exists(index_dir_path) or os.path.getmtime(index_dir_path) < os.path.getmtime(gmt_file_path):
+        build_pathway_index(gmt_file_path, index_dir_path)
+
+    loaded_pathway_indices[gmt_file_path] = PathwayIndex(index_dir_path)
+
+    return loaded_pathway_indices[gmt_file_path]
+
+def build_gene_pathways_dict(gmt_file_path):
+    gene_pathways_dict = {}
+    pathways = set()
+
+    with gzip.open(gmt_file_path, 'rb') as in_gmt_file:
+        for line in in_gmt_file:
+            line_items = line.rstrip(b"\n").split(b"\t")
+
+            data_source = line_items[1].split(b";")[1].replace(b"datasource: ", b"").strip()
+            pathway_name = line_items[1].split(b";")[0].replace(b"name: ", b"").strip() + b" [" + data_source + b"]"
+            genes = line_items[2:]
+
+            # I don't think it makes sense to call something a pathway if there is only one gene
+            if len(genes) < 2:
+                continue
+
+            for gene in genes:
+                if gene not in gene_pathways_dict:
+                    gene_pathways_dict[gene] = set()
+                gene_pathways_dict[gene].add(pathway_name)
+
+                pathways.add(pathway_name)
+
+    return gene_pathways_dict, pathways
+
+# The index is built in a temporary directory and then renamed, so other processes
+#   never see a partially built index.
+def build_pathway_index(gmt_file_path, index_dir_path):
+    gene_pathways_dict, pathways = build_gene_pathways_dict(gmt_file_path)
+
+    temp_dir_path = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(index_dir_path)))
+    save_pathway_index(os.path.join(temp_dir_path, "index"), gene_pathways_dict, pathways)
+
+    shutil.rmtree(index_dir_path, ignore_errors=True)
+    try:
+        os.rename(temp_dir_path, index_dir_path)
+    except OSError:
+        # Another process finished building the index first
+        shutil.rmtree(temp_dir_path, ignore_errors=True)
+
+def save_pathway_index(index_file_path, gene_pathways_dict, pathways):
+    writeStringToFile(index_file_path, ".ngene", str(len(gene_pathways_dict)).encode())
+
+    if len(gene_pathways_dict) == 0:
+        return
+
+    pathway_names = sorted(pathways)
+    pathway_ids = {pathway: i for i, pathway in enumerate(pathway_names)}
+    genes = sorted(gene_pathways_dict.keys())
+
+    writeFixedWidthFile(index_file_path, ".pn", ".mpnl", pathway_names, getMaxStringLength(pathway_names))
+    writeFixedWidthFile(index_file_path, ".gn", ".mgnl", genes, getMaxStringLength(genes))
+
+    gene_pathway_coords = [b"0"]
+    cumulative_position = 0
+    with open(index_file_path + ".gp", 'wb') as gp_file:
+        for gene in genes:
+            gene_pathway_ids = b",".join([str(pathway_ids[x]).encode() for x in sorted(gene_pathways_dict[gene])])
+            gp_file.write(gene_pathway_ids)
+
+            cumulative_position += len(gene_pathway_ids)
+            gene_pathway_coords.append(str(cumulative_position).encode())
+
+    # The last coordinate is the longest
+    writeFixedWidthFile(index_file_path, ".gpc", ".mgpcl", gene_pathway_coords, len(gene_pathway_coords[-1]))
@@ -1,3 +1,5 @@
+from concurrent.futures import ThreadPoolExecutor
+import gzip
 import os
 import sys
 pwd = os.path.dirname(os.path.realpath(__file__))
@@ -107,8 +109,6 @@ build_metadata("TestData/Genes1", merged_genes_file_path)
 
 checkResult("ID", parser1.id, "Test1")
 checkResult("Title 1", parser1.title, "This is the title1")
-checkResult("featureDescription 1", parser1.featureDescription, "gene")
-checkResult("featureDescriptionPlural 1", parser1.featureDescriptionPlural, "genes")
 checkResult("ID", parser2.id, "Test2")
 checkResult("Title 2", parser2.title, "This is the title2")
 checkResult("Num samples 1", parser1.num_samples, 4)
@@ -184,9 +184,6 @@ checkResult("2 groups - group 2 values - search", parser12.search_group("2", "ol
 
 checkResult("No pathways 1", len(parser1.get_pathways()), 0)
 checkResult("No pathways 12", len(parser12.get_pathways()), 0)
-checkResult("Pathways genes1", len(parser_genes1.get_pathways()), 31)
-checkResult("Pathways genes12", len(parser_genes12.get_pathways()), 57)
-checkResult("Pathways genes12 - element", parser_genes12.get_pathways()[0], ('AKT phosphorylates targets in the nucleus [reactome]', 2))
 
 checkResult("Get sample column meta", parser1.get_variable_meta(0), (4, ['1', '2', '3', '4']))
 checkResult("Get num column meta", parser1.get_variable_meta(1), (1.1, 4.4))
@@ -204,6 +201,256 @@ parser1.clean_up(max_age_seconds=0)
 parser1.save_sample_indices_matching_filters([], [])
 checkResult("Clean up", parser1.clean_up(max_age_seconds=0), 1)
 
+checkResult("Sorted sample order", readStringFromFile(fwf_file_path_2, ".ss"), b"2\t0\n3\t1\n4\t2\n5\t3")
+checkResult("Sorted sample order - merged", readStringFromFile(merged_file_path, ".ss"), b"1\t0\n2\t1\n3\t2\n4\t3\n5\t4")
+
+parallel_fwf_file_path = "{}/parallel.fwf".format(tmp_dir)
+convert_tsv_to_fwf(tsv_file_path_2, parallel_fwf_file_path, num_processes=3)
+for file_extension in ["", ".ll", ".cc", ".cn", ".ct", ".cd", ".nrow", ".ncol"]:
+    checkResult("Parallel conversion " + file_extension, readStringFromFile(parallel_fwf_file_path, file_extension), readStringFromFile(fwf_file_path_2, file_extension))
+
+parallel_merged_file_path = "{}/parallel_merged.fwf".format(tmp_dir)
+merge_fwf_files([fwf_file_path_1, fwf_file_path_2], parallel_merged_file_path, num_processes=2)
+for file_extension in ["", ".ll", ".cc", ".cn", ".ct", ".cd", ".ss", ".nrow", ".ncol"]:
+    checkResult("Parallel merge " + file_extension, readStringFromFile(parallel_merged_file_path, file_extension), readStringFromFile(merged_file_path, file_extension))
+
+gmt_file_path = "{}/pathways.gmt.gz".format(tmp_dir)
+with gzip.open(gmt_file_path, 'wb') as gmt_file:
+    gmt_file.write(b"url1\tname: P1; datasource: kegg\tG1\tG2\n")
+    gmt_file.write(b"url2\tname: P2; datasource: reactome\tG2\tG3\tG4\n")
+    gmt_file.write(b"url3\tname: P3; datasource: kegg\tG4\n")
+pathway_index = get_pathway_index(gmt_file_path)
+checkResult("Pathway index - gene in two pathways", pathway_index.get_pathways(b"G2"), [b"P1 [kegg]", b"P2 [reactome]"])
+checkResult("Pathway index - single-gene pathway ignored", pathway_index.get_pathways(b"G4"), [b"P2 [reactome]"])
+checkResult("Pathway index - missing gene", pathway_index.get_pathways(b"G5"), [])
+checkResult("Pathway index - loaded once", get_pathway_index(gmt_file_path) is pathway_index, True)
+try:
+    get_pathway_index("{}/missing.gmt".format(tmp_dir), "file:///missing.gmt")
+    pathway_download_failed = False
+except Exception:
+    pathway_download_failed = True
+checkResult("Pathway index - download failed", (pathway_download_failed, os.path.exists("{}/missing.gmt".format(tmp_dir))), (True, False))
+
+column_summary = ColumnSummary(b"Mixed")
+column_summary.add_values([b"1", b"Low", b"NA"])
+other_column_summary = ColumnSummary(b"Mixed")
+other_column_summary.add_values([b"Low", b"Low", b""])
+checkResult("Column summary - discrete", (other_column_summary.get_type(), other_column_summary.get_description(b"d")), (b"d", b"1|Low"))
+column_summary.merge(other_column_summary)
+checkResult("Column summary - merge", (column_summary.get_type(), column_summary.get_description(b"d")), (b"d", b"2|1,Low"))
+column_summary = ColumnSummary(b"Mixed")
+column_summary.add_values([b"1", b"2", b"3"])
+checkResult("Column summary - numeric", (column_summary.get_type(), column_summary.get_description(b"n"), column_summary.needs_reparse, column_summary.unique_values), (b"n", b"1.00000000,3.00000000", False, None))
+column_summary.merge(other_column_summary)
+checkResult("Column summary - merge needs reparse", column_summary.needs_reparse, True)
+column_summary = ColumnSummary(b"Mixed")
+column_summary.add_values([b"1", b"2", b"3"])
+column_summary.add_values([b"Low"])
+checkResult("Column summary - needs reparse", column_summary.needs_reparse, True)
+
+column_summary = ColumnSummary(b"ID", max_unique_values=100)
+column_summary.add_values([str(i).encode() + b"a" for i in range(5000)])
+checkResult("Column summary - estimated ID", (column_summary.get_type(), column_summary.get_description(b"i"), column_summary.unique_values), (b"i", b"5000|ID", None))
+column_summary = ColumnSummary(b"Discrete", max_unique_values=100)
+column_summary.add_values([str(i % 2500).encode() + b"a" for i in range(5000)])
+checkResult("Column summary - estimated discrete", column_summary.get_type(), b"d")
+checkResult("Column summary - estimated discrete - description", abs(int(column_summary.get_description(b"d").split(b"|")[0]) - 2500) < 100, True)
+
+writeFixedWidthFile(tmp_dir + "/Sidecar", ".sc", ".mscl", (x for x in [b"a", b"abc", b""]), 3)
+with open(tmp_dir + "/Sidecar.sc", "rb") as sidecar_file:
+    checkResult("Fixed-width sidecar", sidecar_file.read(), b"a  \nabc\n   \n")
+checkResult("Fixed-width sidecar - max length", readIntFromFile(tmp_dir + "/Sidecar.mscl"), 3)
+
+estimated_tsv_file_path = "{}/estimated.tsv".format(tmp_dir)
+estimated_fwf_file_path = "{}/estimated.fwf".format(tmp_dir)
+with open(estimated_tsv_file_path, 'wb') as estimated_file:
+    estimated_file.write(b"Sample\tCategory\n")
+    for i in range(1500):
+        estimated_file.write("{}\tC{}\n".format(i, i % 300).encode())
+convert_tsv_to_fwf(estimated_tsv_file_path, estimated_fwf_file_path, max_unique_values=50)
+estimated_options = DataSetParser(estimated_fwf_file_path).search_variable_options(1, "C1", 1000)
+checkResult("Estimated discrete column - unique options", (len(estimated_options), len(set(estimated_options))), (111, 111))
+
+reparsed_tsv_file_path = "{}/reparsed.tsv".format(tmp_dir)
+reparsed_fwf_file_path = "{}/reparsed.fwf".format(tmp_dir)
+with open(reparsed_tsv_file_path, 'wb') as reparsed_file:
+    reparsed_file.write(b"Sample\tDiscrete\tID\n")
+    for i in range(1500):
+        reparsed_file.write("{}\t{}\t{}\n".format(i, i % 3 if i < 1400 else "Low", i if i < 1400 else "ID{}".format(i)).encode())
+convert_tsv_to_fwf(reparsed_tsv_file_path, reparsed_fwf_file_path)
+checkResult("Reparsed columns - types", readStringFromFile(reparsed_fwf_file_path, ".ct"), b"i\nd\ni")
+checkResult("Reparsed columns - descriptions", list(readStringsFromFile(reparsed_fwf_file_path, ".cd")), [b"1500|ID", b"4|0,1,2,Low", b"1500|ID"])
+reparsed_column_summaries = [ColumnSummary(b"Sample"), ColumnSummary(b"Discrete"), ColumnSummary(b"ID")]
+for column_summary in reparsed_column_summaries[1:]:
+    column_summary.add_values([b"1"])
+    column_summary.add_values([b"Low"])
+save_column_types(reparsed_fwf_file_path, [b"Sample", b"Discrete", b"ID"], reparsed_column_summaries, max_block_bytes=100)
+checkResult("Reparsed columns - blocks of rows", list(readStringsFromFile(reparsed_fwf_file_path, ".cd"))[1:], [b"4|0,1,2,Low", b"1500|ID"])
+
+empty_tsv_file_path = "{}/empty_column.tsv".format(tmp_dir)
+empty_fwf_file_path = "{}/empty_column.fwf".format(tmp_dir)
+with open(empty_tsv_file_path, 'wb') as empty_file:
+    empty_file.write(b"Sample\tEmpty\tColor\n" + b"".join(["{}\t\tRed\n".format(i).encode() for i in range(5)]))
+convert_tsv_to_fwf(empty_tsv_file_path, empty_fwf_file_path)
+checkResult("Filter rows - column with no width", DataSetParser(empty_fwf_file_path).save_sample_indices_matching_filters([DiscreteFilter(1, [""])], [])[0], 5)
+
+checkResult("Numeric matrix - values", parser1.get_numeric_values(1).tolist(), [1.1, 2.2, 3.3, 4.4])
+checkResult("Numeric matrix - selected rows", parser12.get_numeric_values(5, [1, 4]).tolist(), [2.0, 5.0])
+checkResult("Numeric matrix - discrete column", parser1.get_numeric_values(3), None)
+
+query_fwf_file_path = "{}/QueryFiles.fwf".format(tmp_dir)
+convert_tsv_to_fwf(tsv_file_path_1, query_fwf_file_path)
+convert_tsv_to_fwf(tsv_file_path_1, query_fwf_file_path, build_query_files=False)
+checkResult("Query files - not built", [os.path.exists(query_fwf_file_path + x) for x in QUERY_FILE_EXTENSIONS], [False] * len(QUERY_FILE_EXTENSIONS))
+checkResult("Query files - query without them", DataSetParser(query_fwf_file_path).find_sample_indices_matching_filters([DiscreteFilter(3, ["Med"])], [NumericFilter(1, ">", 4)]).tolist(), [3])
+save_query_files(query_fwf_file_path)
+checkResult("Query files - built afterward", [os.path.exists(query_fwf_file_path + x) for x in QUERY_FILE_EXTENSIONS], [True] * len(QUERY_FILE_EXTENSIONS))
+
+checkResult("Discrete codes - categories", parse_discrete_categories(b"3|High,Low,Med"), [b"", b"NA", b"High", b"Low", b"Med"])
+checkResult("Discrete codes - values", parser1.get_column_matrix_values(".dcm", ".dcc", 3).tolist(), [3, 2, 4, 4])
+checkResult("Discrete codes - option with comma", parse_discrete_categories(b"2|A,B,C"), None)
+
+checkResult("Filter rows - later filters only see matching rows", parser2.save_sample_indices_matching_filters([DiscreteFilter(3, ["Purple"])], [NumericFilter(4, ">=", -1)])[0], 0)
+checkResult("Filter rows - numeric and discrete", parser12.save_sample_indices_matching_filters([DiscreteFilter(3, ["Med", "High"])], [NumericFilter(1, "<", 4)])[0], 2)
+
+checkResult("Filter expression - or", parser1.save_sample_indices_matching_filters([], [], OrFilter([DiscreteFilter(3, ["Low"]), NumericFilter(2, ">", 40)]))[0], 2)
+checkResult("Filter expression - not", parser1.save_sample_indices_matching_filters([DiscreteFilter(4, ["Med"])], [], NotFilter(NumericFilter(1, "<", 4)))[0], 1)
+checkResult("Filter expression - nested", parser1.save_sample_indices_matching_filters([], [], AndFilter([NotFilter(DiscreteFilter(3, ["Low"])), OrFilter([NumericFilter(1, "<", 3), NumericFilter(1, ">", 4)])]))[0], 2)
+parser1.query([], [], [], [], [], query_file_path, filter_expression=OrFilter([DiscreteFilter(3, ["Low"]), NumericFilter(2, ">", 40)]))
+checkResultFile("Filter expression - query", query_file_path, [[b'Sample', b'FloatA', b'FloatB', b'TempA', b'TempB'], [b'1', b'1.1', b'11.1', b'Low', b'High'], [b'4', b'4.4', b'44.4', b'Med', b'Med']])
+
+checkResult("Explain filters", parser1.explain([DiscreteFilter(3, ["Med"])], [NumericFilter(1, ">", 4)]), [("NumericFilter(1, '>', 4)", 0.25, "histogram"), ("DiscreteFilter(3, ['Med'])", 0.5, "histogram")])
+checkResult("Explain filters - not numeric", parser1.explain([], [NumericFilter(3, ">", 4)]), [("NumericFilter(3, '>', 4)", 1.0, "unknown")])
+
+save_discrete_postings(fwf_file_path_1)
+checkResult("Inverted index - posting lists", parser1.find_posting_row_indices(DiscreteFilter(3, ["Med", "Low"])).tolist(), [0, 2, 3])
+checkResult("Inverted index - query", parser1.save_sample_indices_matching_filters([DiscreteFilter(4, ["Med", "High"])], [NumericFilter(1, ">", 2)])[0], 2)
+
+rebuilt_fwf_file_path = "{}/rebuilt.fwf".format(tmp_dir)
+rebuilt_tsv_file_paths = []
+for rebuild_number, letters in enumerate([[b"a", b"b"] * 5, [b"b"] * 3 + [b"a"] * 7]):
+    rebuilt_tsv_file_paths.append("{}/rebuilt{}.tsv".format(tmp_dir, rebuild_number))
+    with open(rebuilt_tsv_file_paths[-1], 'wb') as rebuilt_file:
+        rebuilt_file.write(b"Sample\tLetter\tX\n")
+        for i, letter in enumerate(letters):
+            rebuilt_file.write("{}\t{}\t{}\n".format(i, letter.decode(), i if rebuild_number == 0 else 100 - i).encode())
+convert_tsv_to_fwf(rebuilt_tsv_file_paths[0], rebuilt_fwf_file_path)
+save_discrete_postings(rebuilt_fwf_file_path)
+save_sorted_numeric_index(rebuilt_fwf_file_path)
+convert_tsv_to_fwf(rebuilt_tsv_file_paths[1], rebuilt_fwf_file_path)
+checkResult("Inverted index - rebuilt dataset", DataSetParser(rebuilt_fwf_file_path).find_sample_indices_matching_filters([DiscreteFilter(1, ["a"])], []).tolist(), list(range(3, 10)))
+
+checkResult("Quantiles - numeric matrix", parser12.get_variable_meta(1, quantiles=[0, 0.5, 1]), (1.1, 4.4, [1.1, 2.75, 4.4]))
+save_sorted_numeric_index(merged_file_path)
+checkResult("Sorted index - range", parser12.find_sorted_row_indices(NumericFilter(1, ">=", 2.2)).tolist(), [1, 2, 3])
+checkResult("Sorted index - not equal", sorted(parser12.find_sorted_row_indices(NumericFilter(1, "!=", 2.2)).tolist()), [0, 2, 3])
+checkResult("Sorted index - query", parser12.save_sample_indices_matching_filters([], [NumericFilter(1, "<", 3), NumericFilter(2, ">", 10)])[0], 2)
+checkResult("Sorted index - rebuilt dataset", DataSetParser(rebuilt_fwf_file_path).find_sorted_row_indices(NumericFilter(2, "<", 93)) is None, True)
+checkResult("Sorted index - rebuilt dataset - query", DataSetParser(rebuilt_fwf_file_path).find_sample_indices_matching_filters([], [NumericFilter(2, "<", 93)]).tolist(), [8, 9])
+checkResult("Quantiles - sorted index", parser12.get_variable_meta(1, quantiles=[0.5, 1]), (1.1, 4.4, [2.75, 4.4]))
+
+save_numeric_zone_maps(merged_file_path, rows_per_block=2)
+parser12 = DataSetParser(merged_file_path)
+checkResult("Zone maps - candidate blocks", parser12.find_candidate_blocks(NumericFilter(1, ">", 3))[0].tolist(), [False, True, False])
+checkResult("Zone maps - not equal", parser12.find_candidate_blocks(NumericFilter(1, "!=", 3))[0].tolist(), [True, True, False])
+checkResult("Zone maps - query", parser12.save_sample_indices_matching_filters([], [NumericFilter(1, ">", 3), NumericFilter(2, "<", 40)])[0], 1)
+
+with DataSetParser(fwf_file_path_1) as open_parser:
+    checkResult("Context manager - meta", [open_parser.get_variable_meta(i) for i in range(5)], [parser1.get_variable_meta(i) for i in range(5)])
+    checkResult("Context manager - filters", open_parser.save_sample_indices_matching_filters([DiscreteFilter(3, ["Med"])], [NumericFilter(1, ">", 0)])[0], 2)
+    open_parser.query([DiscreteFilter(3, ["Med"])], [NumericFilter(1, ">", 0)], [2, 4], [], [], query_file_path)
+    checkResultFile("Context manager - query", query_file_path, [[b'Sample', b'FloatB', b'TempB'], [b'3', b'33.3', b'Med'], [b'4', b'44.4', b'Med']])
+checkResult("Context manager - closed", open_parser.get_variable_meta(1), (1.1, 4.4))
+
+checkResult("In memory - row indices", parser1.find_sample_indices_matching_filters([DiscreteFilter(3, ["Med"])], [NumericFilter(1, ">", 0)]).tolist(), [2, 3])
+checkResult("In memory - column indices", parser1.find_column_indices_to_select([2, 4], [], [])[0].tolist(), [0, 2, 4])
+parser1.build_output_file_from_indices(np.array([2, 3]), *parser1.find_column_indices_to_select([2, 4], [], []), query_file_path, "tsv")
+checkResultFile("In memory - output file", query_file_path, [[b'Sample', b'FloatB', b'TempB'], [b'3', b'33.3', b'Med'], [b'4', b'44.4', b'Med']])
+checkResult("Streaming output - chunks", list(parser1.iter_query([DiscreteFilter(3, ["Med"])], [NumericFilter(1, ">", 0)], [2, 4], [], [], chunk_size=1)), [b"Sample\tFloatB\tTempB\n", b"3\t33.3\tMed\n", b"4\t44.4\tMed\n"])
+parser12.query([DiscreteFilter(3, ["Med"])], [NumericFilter(1, ">", 0)], [], [], [], query_file_path)
+checkResult("Streaming output - same as query", b"".join(parser12.iter_query([DiscreteFilter(3, ["Med"])], [NumericFilter(1, ">", 0)], [], [], [])), readStringFromFile(query_file_path) + b"\n")
+row_indices, col_indices, col_names = parser12.find_sample_indices_matching_filters([], []), *parser12.find_column_indices_to_select([], [], [])
+extraction_plan = compile_extraction_plan([[1, 2, 5], [2, 5, 6], [4, 9, 12]])
+checkResult("Extraction plan - struct", (extraction_plan[0], extraction_plan[1].format), (2, "3s1s3x3s"))
+checkResult("Extraction plan - values", parse_row_values(1, 13, extraction_plan, b"abcdefghijkl\nABCDEFGHIJKL\n"), (b"CDE", b"F", b"JKL"))
+checkResult("Extraction plan - out of order", compile_extraction_plan([[2, 5, 6], [1, 2, 5]]), None)
+checkResult("Parallel output", b"".join(parser12.iter_output(row_indices, col_indices, col_names, num_processes=2, rows_per_task=2)), b"".join(parser12.iter_output(row_indices, col_indices, col_names)))
+checkResult("Parallel output - task bytes", b"".join(parser12.iter_output(row_indices, col_indices, col_names, num_processes=2, task_bytes=2 * readIntFromFile(merged_file_path, ".ll"))), b"".join(parser12.iter_output(row_indices, col_indices, col_names)))
+npy_file_path = "{}/query.npy".format(tmp_dir)
+parser1.query([DiscreteFilter(3, ["Med"])], [NumericFilter(1, ">", 0)], [2, 4], [], [], npy_file_path, "npy")
+checkResult("Binary output - npy", np.load(npy_file_path).tolist(), [(b'3', 33.3, b'Med'), (b'4', 44.4, b'Med')])
+npz_file_path = "{}/query.npz".format(tmp_dir)
+parser12.query([], [NumericFilter(1, ">", 2)], [5, 7], [], [], npz_file_path, "npz")
+checkResult("Binary output - npz", [np.load(npz_file_path)[name].tolist() for name in ["Sample", "2__IntA", "2__ColorA"]], [[b'2', b'3', b'4'], [2.0, 3.0, 4.0], [b'Red', b'Red', b'Orange']])
+batches = list(parser12.iter_column_batches(np.arange(5), [0, 1], [b"i", b"n"], batch_bytes=8))
+checkResult("Binary output - batches bounded by bytes", [len(batch[0]) for batch in batches], [2, 2, 1])
+checkResult("Binary output - batch values", [batches[1][0].tolist(), batches[1][1].tolist(), np.isnan(batches[2][1][0])], [[b'3', b'4'], [3.3, 4.4], True])
+try:
+    import pyarrow
+    import pyarrow.parquet
+
+    arrow_file_path = "{}/query.arrow".format(tmp_dir)
+    parser12.query([], [NumericFilter(1, ">", 2)], [5, 7], [], [], arrow_file_path, "arrow")
+    checkResult("Binary output - arrow", pyarrow.ipc.open_file(arrow_file_path).read_all().to_pydict(), {"Sample": ["2", "3", "4"], "2__IntA": [2.0, 3.0, 4.0], "2__ColorA": ["Red", "Red", "Orange"]})
+    parquet_file_path = "{}/query.parquet".format(tmp_dir)
+    parser12.query([], [NumericFilter(0, "==", 1)], [1, 5], [], [], parquet_file_path, "parquet")
+    checkResult("Binary output - parquet", pyarrow.parquet.read_table(parquet_file_path).to_pydict(), {"Sample": ["1"], "1__FloatA": [1.1], "2__IntA": [None]})
+except ImportError:
+    print("Skipped the arrow and parquet checks (pyarrow is not installed)")
+
+writeStringToFile(fwf_file_path_1, ".timestamp", b"1")
+registry_parser = get_parser(fwf_file_path_1)
+checkResult("Parser registry - same parser", get_parser(fwf_file_path_1) is registry_parser, True)
+checkResult("Parser registry - filters", registry_parser.save_sample_indices_matching_filters([DiscreteFilter(3, ["Med"])], [NumericFilter(1, ">", 0)])[0], 2)
+writeStringToFile(fwf_file_path_1, ".timestamp", b"2")
+checkResult("Parser registry - timestamp changed", get_parser(fwf_file_path_1) is registry_parser, False)
+get_parser(fwf_file_path_1).get_variable_meta(1)
+get_parser(merged_file_path, max_open_files=0)
+checkResult("Parser registry - eviction", list(open_parsers.keys()), [merged_file_path])
+with get_parser(merged_file_path) as registry_parser:
+    registry_parser.get_variable_meta(1)
+checkResult("Parser registry - still open after with block", registry_parser.count_open_files()[0] > 0, True)
+with ThreadPoolExecutor(max_workers=8) as executor:
+    thread_results = list(executor.map(lambda i: get_parser(merged_file_path).find_sample_indices_matching_filters([DiscreteFilter(3, ["Med"])], [NumericFilter(i % 3, ">", 0)]).tolist(), range(50)))
+checkResult("Parser registry - threads", thread_results, [parser12.find_sample_indices_matching_filters([DiscreteFilter(3, ["Med"])], [NumericFilter(i % 3, ">", 0)]).tolist() for i in range(50)])
+os.remove(fwf_file_path_1 + ".timestamp")
+
+compressed_file_path = "{}/compressed.fwf".format(tmp_dir)
+for file_path in glob.glob(merged_file_path + "*"):
+    shutil.copy(file_path, file_path.replace(merged_file_path, compressed_file_path))
+compress_fwf_file(compressed_file_path, rows_per_block=2, remove_uncompressed=True)
+parser_compressed = DataSetParser(compressed_file_path)
+parser12.query([DiscreteFilter(3, ["Med"])], [NumericFilter(1, ">", 0)], [], [], [], query_file_path)
+expected_query_result = readFileIntoLists(query_file_path)
+parser_compressed.query([DiscreteFilter(3, ["Med"])], [NumericFilter(1, ">", 0)], [], [], [], query_file_path)
+checkResultFile("Compressed file - query", query_file_path, expected_query_result)
+filter_expression = OrFilter([NotFilter(DiscreteFilter(4, ["High"])), NumericFilter(2, "<", 3)])
+checkResult("Compressed file - filter expression", parser_compressed.save_sample_indices_matching_filters([], [], filter_expression)[0], parser12.save_sample_indices_matching_filters([], [], filter_expression)[0])
+checkResult("Compressed file - sample options", parser_compressed.search_variable_options(0, search_str=None), parser12.search_variable_options(0, search_str=None))
+checkResult("Compressed file - block cache counted", parser_compressed.count_open_files()[1] > 0, True)
+parser_compressed.query([], [NumericFilter(1, ">", 2)], [5, 7], [], [], npz_file_path, "npz")
+checkResult("Compressed file - npz", np.load(npz_file_path)["2__ColorA"].tolist(), [b'Red', b'Red', b'Orange'])
+checkResult("Compressed file - parallel output", b"".join(parser_compressed.iter_output(row_indices, col_indices, col_names, num_processes=2, rows_per_task=2)), b"".join(parser12.iter_output(row_indices, col_indices, col_names)))
+checkResult("Compressed file - across blocks", CompressedFwfFile(compressed_file_path)[0:(parser12.num_samples * readIntFromFile(merged_file_path, ".ll"))], readStringFromFile(merged_file_path) + b"\n")
+block_cache = BlockCache(max_bytes=5)
+block_cache.add(0, b"abc")
+block_cache.add(1, b"de")
+block_cache.get(0)
+block_cache.add(2, b"f")
+checkResult("Block cache - bounded by bytes", (list(block_cache.blocks.keys()), block_cache.num_bytes), ([0, 2], 4))
+compress_fwf_file(merged_file_path, block_bytes=3 * readIntFromFile(merged_file_path, ".ll"))
+checkResult("Compressed file - rows per block from bytes", readIntFromFile(merged_file_path, ".brow"), 3)
+convert_tsv_to_fwf(rebuilt_tsv_file_paths[0], rebuilt_fwf_file_path)
+compress_fwf_file(rebuilt_fwf_file_path)
+convert_tsv_to_fwf(rebuilt_tsv_file_paths[1], rebuilt_fwf_file_path)
+checkResult("Compressed file - removed when rebuilt", os.path.exists(rebuilt_fwf_file_path + ".blocks"), False)
+
+# These counts depend on the full Pathway Commons GMT file (DEFAULT_GMT_FILE_URL), so they
+#   are checked last; the checks above also pass with a local copy of part of the file.
+checkResult("Pathways genes1", len(parser_genes1.get_pathways()), 31)
+checkResult("Pathways genes12", len(parser_genes12.get_pathways()), 57)
+checkResult("Pathways genes12 - element", parser_genes12.get_pathways()[0], ('AKT phosphorylates targets in the nucleus [reactome]', 2))
+
 print("Passed all tests!!")
 
 #TODO: Clean up WishBuilder.py so that it doesn't store TSV files in /Applications/GeneyWishBuilder/WishBuilder-CLI/GeneDatasets.
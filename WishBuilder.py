@@ -9,6 +9,7 @@ import shutil
 import sys
 from tests import *
 import time
+from CompressedFwf import *
 from Constants import *
 from DataSetBuilder import *
 from GithubDao import GithubDao
@@ -157,7 +158,7 @@ def test(pr: PullRequest, sql_dao):
     shutil.rmtree(raw_data_storage, ignore_errors=True)
     print("Done")
 
-def build_geney_files(pr: PullRequest, test_dir, raw_data_storage):
+def build_geney_files(pr: PullRequest, test_dir, raw_data_storage, num_processes=NUM_BUILD_PROCESSES, max_unique_values=MAX_UNIQUE_VALUES, compress=COMPRESS_DATA_FILES, build_sorted_index=BUILD_SORTED_INDEX):
     printToLog("Building files for use in Geney", pr)
 
     cwd = os.getcwd()
@@ -180,7 +181,7 @@ def build_geney_files(pr: PullRequest, test_dir, raw_data_storage):
         fwf_files.append(fwf_file)
 
         printToLog("Creating fixed-width file for {}".format(tsv_file), pr)
-        convert_tsv_to_fwf(tsv_file, fwf_file)
+        convert_tsv_to_fwf(tsv_file, fwf_file, num_processes, max_unique_values, build_query_files=False)
         printToLog("Done creating fixed-width file for {}".format(tsv_file), pr)
 
     out_data_file_path = os.path.join(geney_dataset_path, "data.fwf")
@@ -193,10 +194,25 @@ def build_geney_files(pr: PullRequest, test_dir, raw_data_storage):
             os.system("mv {} {}{}".format(f, out_data_file_path, parse_file_ext(f)))
     else:
         printToLog("Creating merged file {} from {}".format(out_data_file_path, " and ".join(fwf_files)), pr)
-        merge_fwf_files(fwf_files, out_data_file_path)
+        merge_fwf_files(fwf_files, out_data_file_path, num_processes, build_query_files=False)
         build_metadata(os.path.join(test_dir, pr.branch), out_data_file_path)
         printToLog("Done creating merged file {} from {}".format(out_data_file_path, " and ".join(fwf_files)), pr)
 
+    # These are built once, on the final file, rather than for each file before merging
+    printToLog("Building query files for {}".format(out_data_file_path), pr)
+    save_query_files(out_data_file_path, num_processes)
+
+    printToLog("Building inverted index for discrete columns in {}".format(out_data_file_path), pr)
+    save_discrete_postings(out_data_file_path)
+
+    if build_sorted_index:
+        printToLog("Building sorted index for numeric columns in {}".format(out_data_file_path), pr)
+        save_sorted_numeric_index(out_data_file_path, num_processes)
+
+    if compress:
+        printToLog("Compressing {}".format(out_data_file_path), pr)
+        compress_fwf_file(out_data_file_path, remove_uncompressed=True)
+
     os.chdir(cwd)
 
     printToLog("Setting permissions on {}".format(geney_dataset_path), pr)
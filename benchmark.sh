@@ -0,0 +1,10 @@
+#! /bin/bash
+
+set -o errexit
+
+tmp_dir="/tmp/WishBuilder_Benchmarks"
+
+mkdir -p $tmp_dir
+rm -rf $tmp_dir/*
+
+python3 Benchmark.py $tmp_dir